@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+cold_tier.py
+------------
+تقسيم ساخن/بارد لـ historical_data و technical_indicators و candle_patterns (migration_185).
+
+- الجداول الساخنة تحتفظ بآخر COLD_HOT_DAYS يوماً فقط؛ historical_data يحتفظ بـ COLD_WARMUP_DAYS
+  إضافية حتى تبقى SMA200 و EMA صحيحة عند إعادة حساب المؤشرات من السجل الساخن وحده.
+- الصفوف الأقدم تُنقل إلى ملفات Parquet مضغوطة (zstd) لكل جدول/رمز/سنة في bucket COLD_BUCKET
+  (مع نسخة محلية في COLD_DIR؛ COLD_BUCKET فارغ = محلياً فقط)، وكل ملف يُسجَّل في cold_archive_files.
+- نفس ترتيب أرشيف سجل الأنشطة (migration_144): تصدير ثم تحقق ثم حذف. الحذف عبر delete_tiered_rows
+  يُلغى كاملاً إذا لم يطابق عدد الصفوف ما أُرشف للتو.
+- read_merged(): قارئ شفاف يدمج البارد مع الساخن (الساخن يفوز عند التكرار) لإعادة حساب السجل
+  الكامل أو الاختبار الرجعي؛ بنفس شكل قراءة PostgREST (date نصي ISO، مرتّب تصاعدياً).
+- COLD_TIERING=1 يُفعّل الأرشفة، ويجعل سكربت المؤشرات لا يكتب صفوفاً أقدم من حد الجدول الساخن
+  (hot_rows) حتى لا تعود صفوف الإحماء الناقصة إلى الجداول وتُدمج فوق القيم المؤرشفة.
+- pyarrow يُستورد عند أول قراءة/كتابة Parquet فقط.
+
+مثال:
+    python cold_tier.py --dry-run          # عدد الصفوف التي ستُنقل لكل جدول
+    python cold_tier.py                    # أرشفة وحذف
+    import cold_tier
+    hist = cold_tier.read_merged(sb, "historical_data", "AAPL", ["date", "close"])
+"""
+
+import os, io, hashlib, argparse
+from datetime import date, timedelta
+from pipeline_core import get_client, load_symbols, lazy_import, PAGE
+
+pd = lazy_import("pandas")
+
+COLD_TIERING = os.getenv("COLD_TIERING", "0") == "1"
+COLD_HOT_DAYS = int(os.getenv("COLD_HOT_DAYS", "730"))
+COLD_WARMUP_DAYS = int(os.getenv("COLD_WARMUP_DAYS", "400"))  # ~275 شمعة، أكثر من نافذة SMA200
+COLD_BUCKET = os.getenv("COLD_BUCKET", "cold-archive")
+COLD_DIR = os.getenv("COLD_DIR", ".cold_archive")
+COLD_COMPRESSION = "zstd"
+
+# مفتاح الصف داخل ملف الرمز لكل جدول مُقسَّم
+KEYS = {
+    "historical_data": ["date"],
+    "technical_indicators": ["date"],
+    "candle_patterns": ["date", "pattern_name"],
+}
+DROP = {"id"}  # مفتاح متسلسل لا معنى له خارج الجدول
+
+# -------- الحدود --------
+def hot_days(table):
+    return COLD_HOT_DAYS + (COLD_WARMUP_DAYS if table == "historical_data" else 0)
+
+def cutoff(table, today=None):
+    """أول تاريخ (ISO) يبقى في الجدول الساخن."""
+    return ((today or date.today()) - timedelta(days=hot_days(table))).isoformat()
+
+def hot_rows(table, rows):
+    """عند COLD_TIERING: يُسقط الصفوف الأقدم من حد الجدول الساخن قبل الكتابة."""
+    if not COLD_TIERING or not rows:
+        return rows
+    start = cutoff(table)
+    return [r for r in rows if str(r["date"])[:10] >= start]
+
+# -------- التخزين --------
+def _checksum(data):
+    return hashlib.md5(data).hexdigest()
+
+def _path(table, sym, year):
+    return f"{table}/{sym}/{year}.parquet"
+
+def _write_local(path, data):
+    local = os.path.join(COLD_DIR, path)
+    os.makedirs(os.path.dirname(local), exist_ok=True)
+    tmp = local + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, local)
+
+def _put(sb, path, data):
+    _write_local(path, data)
+    if not COLD_BUCKET:
+        return
+    bucket = sb.storage.from_(COLD_BUCKET)
+    bucket.upload(path, data, {"content-type": "application/octet-stream", "upsert": "true"})
+    # لا حذف من الجدول الساخن قبل التأكد أن ما في الـ bucket هو ما كُتب
+    if _checksum(bucket.download(path)) != _checksum(data):
+        raise RuntimeError(f"checksum mismatch after upload: {path}")
+
+def _get(sb, entry):
+    """محتوى ملف من cold_archive_files؛ النسخة المحلية تُستخدم إذا طابق checksum."""
+    local = os.path.join(COLD_DIR, entry["path"])
+    if os.path.exists(local):
+        with open(local, "rb") as f:
+            data = f.read()
+        if _checksum(data) == entry["checksum"]:
+            return data
+    if not COLD_BUCKET:
+        raise FileNotFoundError(local)
+    data = sb.storage.from_(COLD_BUCKET).download(entry["path"])
+    if _checksum(data) != entry["checksum"]:
+        raise RuntimeError(f"checksum mismatch: {entry['path']}")
+    _write_local(entry["path"], data)
+    return data
+
+def _to_parquet(df):
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False, compression=COLD_COMPRESSION)
+    return buf.getvalue()
+
+def _from_parquet(data):
+    return pd.read_parquet(io.BytesIO(data))
+
+def _frame(rows):
+    df = pd.DataFrame(rows)
+    df = df.drop(columns=[c for c in DROP if c in df.columns])
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+    return df
+
+def _merge(old, new, table):
+    keys = KEYS[table]
+    df = pd.concat([old, new], ignore_index=True)
+    return df.drop_duplicates(keys, keep="last").sort_values(keys).reset_index(drop=True)
+
+# -------- القراءة --------
+def fetch_hot(sb, table, sym, columns=None, since=None, before=None):
+    """صفوف الرمز من الجدول الساخن على صفحات PAGE (حد PostgREST)."""
+    select = ",".join(dict.fromkeys(KEYS[table] + list(columns))) if columns else "*"
+    rows, start = [], 0
+    while True:
+        q = sb.table(table).select(select).eq("stock_symbol", sym)
+        if since:
+            q = q.gte("date", since)
+        if before:
+            q = q.lt("date", before)
+        for k in KEYS[table]:
+            q = q.order(k)
+        res = q.range(start, start + PAGE - 1).execute()
+        data = res.data or []
+        rows.extend(data)
+        if len(data) < PAGE:
+            break
+        start += PAGE
+    return rows
+
+def load_manifest(sb, table, sym):
+    """{year: صف cold_archive_files} لملفات الرمز."""
+    res = (sb.table("cold_archive_files").select("*")
+             .eq("table_name", table).eq("stock_symbol", sym).execute())
+    return {int(r["year"]): r for r in (res.data or [])}
+
+def read_cold(sb, table, sym, columns=None, since=None, before=None):
+    """الصفوف المؤرشفة للرمز (date نصي ISO)؛ تُقرأ فقط الملفات التي يتقاطع مداها مع [since, before)."""
+    parts = []
+    for _, entry in sorted(load_manifest(sb, table, sym).items()):
+        if since and str(entry["max_date"]) < since:
+            continue
+        if before and str(entry["min_date"]) >= before:
+            continue
+        parts.append(_from_parquet(_get(sb, entry)))
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    if since:
+        df = df[df["date"] >= since]
+    if before:
+        df = df[df["date"] < before]
+    if columns:
+        df = df[[c for c in dict.fromkeys(KEYS[table] + list(columns)) if c in df.columns]]
+    return df.reset_index(drop=True)
+
+def read_merged(sb, table, sym, columns=None, since=None):
+    """السجل الكامل للرمز: البارد ثم الساخن، والساخن يفوز عند تكرار المفتاح."""
+    hot = pd.DataFrame(fetch_hot(sb, table, sym, columns, since=since))
+    hot = hot.drop(columns=[c for c in DROP if c in hot.columns])
+    try:
+        cold = read_cold(sb, table, sym, columns, since=since)
+    except Exception as e:
+        print(f"[WARN] cold tier unavailable for {table}/{sym}: {e}")
+        return hot
+    if cold.empty:
+        return hot
+    if hot.empty:
+        return cold
+    keys = KEYS[table]
+    df = pd.concat([cold, hot], ignore_index=True)
+    return df.drop_duplicates(keys, keep="last").sort_values(keys).reset_index(drop=True)
+
+# -------- الأرشفة --------
+def archive_symbol(sb, table, sym, before, dry_run=False):
+    """
+    ينقل صفوف sym الأقدم من before إلى ملفات السنوات (دمجاً مع الموجود) ثم يحذفها من الجدول
+    الساخن. يعيد (عدد الصفوف، عدد الملفات).
+    """
+    rows = fetch_hot(sb, table, sym, before=before)
+    if not rows or dry_run:
+        return len(rows), 0
+    df = _frame(rows)
+    manifest = load_manifest(sb, table, sym)
+    entries = []
+    for year, part in df.groupby(df["date"].map(lambda d: d.year)):
+        year = int(year)
+        if year in manifest:
+            part = _merge(_from_parquet(_get(sb, manifest[year])), part, table)
+        data = _to_parquet(part)
+        if len(_from_parquet(data)) != len(part):
+            raise RuntimeError(f"parquet round trip lost rows for {table}/{sym}/{year}")
+        path = _path(table, sym, year)
+        _put(sb, path, data)
+        entries.append({
+            "table_name": table, "stock_symbol": sym, "year": year, "path": path,
+            "row_count": len(part), "min_date": str(part["date"].min()), "max_date": str(part["date"].max()),
+            "checksum": _checksum(data),
+        })
+    sb.table("cold_archive_files").upsert(entries, on_conflict="table_name,stock_symbol,year").execute()
+    sb.rpc("delete_tiered_rows", {"p_table": table, "p_symbol": sym,
+                                  "p_before": before, "p_expected": len(rows)}).execute()
+    return len(rows), len(entries)
+
+def archive_table(sb, table, syms, dry_run=False):
+    before = cutoff(table)
+    moved = files = 0; failed = []
+    for sym in syms:
+        try:
+            n, f = archive_symbol(sb, table, sym, before, dry_run)
+            moved += n; files += f
+        except Exception as e:
+            print(f"[WARN] archive failed for {table}/{sym}: {e}")
+            failed.append(sym)
+    verb = "would move" if dry_run else "moved"
+    print(f"[INFO] {table}: {verb} {moved} rows older than {before} ({files} files written, {len(failed)} symbols failed)")
+    return moved
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Move rows older than the hot horizon to the Parquet cold tier.")
+    ap.add_argument("--tables", default=",".join(KEYS), help="comma-separated tables to tier")
+    ap.add_argument("--dry-run", action="store_true", help="only count the rows that would move")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not COLD_TIERING:
+        print("[INFO] COLD_TIERING is not enabled; nothing to archive.")
+        return
+    sb = get_client()
+    if sb is None:
+        return
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    unknown = [t for t in tables if t not in KEYS]
+    if unknown:
+        raise SystemExit(f"not a tiered table: {', '.join(unknown)}")
+    syms = load_symbols(tracked_only=False)
+    print(f"[INFO] Tiering {len(syms)} symbols: hot {COLD_HOT_DAYS}d (+{COLD_WARMUP_DAYS}d history warm-up), "
+          f"bucket {COLD_BUCKET or '(local only)'}")
+    for table in tables:
+        archive_table(sb, table, syms, args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,31 @@
 # -*- coding: utf-8 -*-
-import os, math, traceback
-import pandas as pd
-import numpy as np
-from dotenv import load_dotenv
-from supabase import create_client
+import os, json, math, time, queue, threading, traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import indicator_state
+import cold_tier
+import pg_bulk
+import row_diff
+import fingerprints
+from pipeline_core import get_client, load_symbols, lazy_import
 from tqdm import tqdm
 
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
-SYMBOLS_FILTER = [s.strip().upper() for s in os.getenv("SYMBOLS_FILTER","").split(",") if s.strip()]
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
 
-def get_client():
-    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
-        print("[WARN] Missing Supabase env vars."); return None
-    try:
-        return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
-    except Exception as e:
-        print(f"[WARN] Cannot connect Supabase: {e}"); return None
-
-sb = get_client()
+# 1 = تحديث تراكمي من indicator_state (O(1) لكل شمعة جديدة) بدل إعادة الحساب الكامل
+INDICATORS_INCREMENTAL = os.getenv("INDICATORS_INCREMENTAL", "0") == "1"
+# 1 = جلب/حساب/كتابة متداخلة: خيوط جلب مسبق + حساب في الخيط الرئيسي + خيط كتابة بدفعات كبيرة
+INDICATORS_PIPELINED = os.getenv("INDICATORS_PIPELINED", "0") == "1"
+INDICATORS_FETCH_WORKERS = int(os.getenv("INDICATORS_FETCH_WORKERS", "4"))
+INDICATORS_QUEUE_DEPTH = int(os.getenv("INDICATORS_QUEUE_DEPTH", "16"))  # رموز في الذاكرة لكل طابور
+INDICATORS_WRITE_BATCH = int(os.getenv("INDICATORS_WRITE_BATCH", "0"))    # 0 = 1000 (PostgREST) أو 50000 (COPY)
+# sql = الحساب داخل Postgres عبر RPC compute_indicators_sql (migration_182) بلا نقل السجل عبر الشبكة
+INDICATORS_ENGINE = os.getenv("INDICATORS_ENGINE", "python").lower()
+INDICATORS_SQL_CHUNK = int(os.getenv("INDICATORS_SQL_CHUNK", "50"))  # رموز لكل استدعاء RPC (حد statement_timeout)
+# 1 = إعادة الحساب على السجل الكامل (الساخن + أرشيف cold_tier) وكتابة كل الصفوف، مثلاً بعد تغيير
+# تعريف مؤشر؛ الصفوف القديمة تعود إلى الأرشيف في تشغيل cold_tier التالي
+INDICATORS_FULL_HISTORY = os.getenv("INDICATORS_FULL_HISTORY", "0") == "1"
 
 # -------- helpers: indicators --------
 def sma(series, n): return series.rolling(n, min_periods=n).mean()
@@ -79,6 +85,7 @@ def detect_candles(df):
 
 # -------- DB helpers --------
 def fetch_indicator_defs():
+    sb = get_client()
     if sb is None: return []
     try:
         res = sb.table("indicator_definitions").select("*").execute()
@@ -86,39 +93,90 @@ def fetch_indicator_defs():
     except Exception as e:
         print(f"[WARN] fetch_indicator_defs failed: {e}"); return []
 
-def load_symbols():
-    if sb is None: return SYMBOLS_FILTER
+def fetch_history(sym):
+    sb = get_client()
+    if sb is None: return pd.DataFrame()
     try:
-        q = sb.table("stocks").select("symbol").eq("is_tracked", True).execute()
-        syms = [r["symbol"] for r in (q.data or []) if r.get("symbol")]
-        if SYMBOLS_FILTER: syms = [s for s in syms if s in SYMBOLS_FILTER]
-        return syms
+        if INDICATORS_FULL_HISTORY:
+            return cold_tier.read_merged(sb, "historical_data", sym, ["date","open","high","low","close","volume"])
+        # على صفحات: السجل المعاد بناؤه (HISTORY_REBUILD_PERIOD) يتجاوز حد الـ 1000 صف
+        return pd.DataFrame(cold_tier.fetch_hot(sb, "historical_data", sym, ["open","high","low","close","volume"]))
     except Exception as e:
-        print(f"[WARN] load_symbols failed: {e}"); return SYMBOLS_FILTER
+        print(f"[WARN] fetch_history failed for {sym}: {e}"); return pd.DataFrame()
 
-def fetch_history(sym):
+def fetch_history_since(sym, last_date):
+    sb = get_client()
     if sb is None: return pd.DataFrame()
     try:
-        res = (sb.table("historical_data")
-               .select("date,open,high,low,close,volume")
-               .eq("stock_symbol", sym).order("date")).execute()
-        return pd.DataFrame(res.data or [])
+        # على صفحات: حالة متأخرة أكثر من 1000 شمعة لا تُقطع عند حد PostgREST فتتخطى شموعاً
+        rows = cold_tier.fetch_hot(sb, "historical_data", sym, ["open","high","low","close","volume"], since=last_date)
+        return pd.DataFrame([r for r in rows if str(r["date"]) > str(last_date)])
     except Exception as e:
-        print(f"[WARN] fetch_history failed for {sym}: {e}"); return pd.DataFrame()
+        print(f"[WARN] fetch_history_since failed for {sym}: {e}"); return pd.DataFrame()
 
-def upsert_indicators(rows):
+def load_states(syms, chunk=200):
+    sb = get_client()
+    if sb is None or not syms: return {}
+    states = {}
+    try:
+        for i in range(0, len(syms), chunk):
+            res = sb.table("indicator_state").select("stock_symbol,state").in_("stock_symbol", syms[i:i+chunk]).execute()
+            for r in (res.data or []):
+                if r.get("state"): states[r["stock_symbol"]] = r["state"]
+    except Exception as e:
+        print(f"[WARN] load_states failed: {e}")
+    return states
+
+def save_states(rows, chunk=500):
+    sb = get_client()
     if sb is None or not rows: return
+    for i in range(0, len(rows), chunk):
+        try:
+            sb.table("indicator_state").upsert(rows[i:i+chunk], on_conflict="stock_symbol").execute()
+        except Exception as e:
+            print(f"[WARN] upsert indicator_state failed: {e}")
+
+def hot_only(table, rows):
+    # مع COLD_TIERING لا تُكتب صفوف أقدم من حد الجدول الساخن (إلا عند INDICATORS_FULL_HISTORY)
+    return rows if INDICATORS_FULL_HISTORY else cold_tier.hot_rows(table, rows)
+
+# كتابة الصفوف تعيد True عند النجاح (أو لا شيء للكتابة)، حتى لا تُحفظ حالة أو بصمة لرمز لم تُكتب صفوفه
+def upsert_indicators(rows):
+    sb = get_client()
+    rows = hot_only("technical_indicators", rows)
+    rows = row_diff.filter_changed(sb, "technical_indicators", rows)
+    if not rows: return True
+    if pg_bulk.enabled():
+        try:
+            pg_bulk.copy_upsert("technical_indicators", rows, ["stock_symbol", "date"])
+            row_diff.mark_written(sb, "technical_indicators", rows)
+            return True
+        except Exception as e:
+            print(f"[WARN] COPY upsert technical_indicators failed: {e}"); return False
+    if sb is None: return False
     try:
         sb.table("technical_indicators").upsert(rows, on_conflict="stock_symbol,date").execute()
+        row_diff.mark_written(sb, "technical_indicators", rows)
+        return True
     except Exception as e:
-        print(f"[WARN] upsert technical_indicators failed: {e}")
+        print(f"[WARN] upsert technical_indicators failed: {e}"); return False
 
 def upsert_candles(rows):
-    if sb is None or not rows: return
+    sb = get_client()
+    rows = hot_only("candle_patterns", rows)
+    if not rows: return True
+    if pg_bulk.enabled():
+        try:
+            pg_bulk.copy_upsert("candle_patterns", rows, ["stock_symbol", "date", "pattern_name"])
+            return True
+        except Exception as e:
+            print(f"[WARN] COPY upsert candle_patterns failed: {e}"); return False
+    if sb is None: return False
     try:
         sb.table("candle_patterns").upsert(rows, on_conflict="stock_symbol,date,pattern_name").execute()
+        return True
     except Exception as e:
-        print(f"[WARN] upsert candle_patterns failed: {e}")
+        print(f"[WARN] upsert candle_patterns failed: {e}"); return False
 
 # -------- compute indicators --------
 def compute_technical_set(df, defs):
@@ -175,42 +233,281 @@ def compute_technical_set(df, defs):
     if all_nan_cols: out = out.drop(columns=all_nan_cols)
     return out
 
+def clean_history(hist):
+    hist = hist.sort_values("date").reset_index(drop=True)
+    for col in ["open","high","low","close","volume"]:
+        if col in hist.columns: hist[col] = pd.to_numeric(hist[col], errors="coerce")
+    return hist.dropna(subset=["open","high","low","close"])
+
+def indicator_rows(sym, hist, tech):
+    rows_t = []
+    idx_map = {i: hist.loc[i, "date"] for i in tech.index}
+    for i, row in tech.iterrows():
+        values = {k: float(v) for k, v in row.items() if isinstance(v, (int,float,np.floating)) and not pd.isna(v)}
+        if "macd_cross" in row and not pd.isna(row["macd_cross"]): values["macd_cross"] = int(row["macd_cross"])
+        if "rsi_zone" in row and not pd.isna(row["rsi_zone"]):   values["rsi_zone"] = int(row["rsi_zone"])
+        if not values: continue
+        payload = {"stock_symbol": sym, "date": idx_map[i]}; payload.update(values)
+        rows_t.append(payload)
+    return rows_t
+
+def candle_rows(sym, hist):
+    patts = detect_candles(hist)
+    return [{"stock_symbol": sym, "date": d, "pattern_name": name,
+             "description": None, "bullish": bull, "confidence": conf}
+            for d, name, bull, conf in patts]
+
+def compute_symbol(sym, hist, defs):
+    """hist (cleaned) -> (tech frame, technical_indicators rows, candle_patterns rows)."""
+    tech = compute_technical_set(hist, defs)
+    return tech, indicator_rows(sym, hist, tech), candle_rows(sym, hist)
+
+def compute_symbol_incremental(sym, defs, saved):
+    """
+    يحدّث المؤشرات للشموع الجديدة فقط انطلاقاً من الحالة المحفوظة.
+    عند غياب الحالة أو تغيّر إعداد المؤشرات: حساب كامل ثم بناء الحالة من السجل.
+    يعيد (rows_t, rows_c, state_row) أو None إذا لا يوجد سجل.
+    """
+    cfg = indicator_state.config_from_defs(defs)
+    state = None
+    if saved and saved.get("config") == cfg and saved.get("last_date"):
+        state = indicator_state.SymbolIndicatorState.from_dict(saved)
+
+    if state is None:
+        hist = fetch_history(sym)
+        if hist.empty: return None
+        hist = clean_history(hist)
+        _, rows_t, rows_c = compute_symbol(sym, hist, defs)
+        state, _ = indicator_state.replay(cfg, hist)
+    else:
+        new = fetch_history_since(sym, state.last_date)
+        if new.empty: return [], [], None
+        new = clean_history(new)
+        bars = new[["date","open","high","low","close"]].to_dict("records")
+        rows_t = []
+        for bar in bars:
+            values = state.update(bar)
+            if values: rows_t.append({"stock_symbol": sym, "date": bar["date"], **values})
+        # detect_candles يحتاج الشمعة السابقة لأول شمعة جديدة
+        prev = pd.DataFrame([saved["prev_bar"]]) if saved.get("prev_bar") else pd.DataFrame()
+        rows_c = candle_rows(sym, pd.concat([prev, new], ignore_index=True))
+
+    state_row = {"stock_symbol": sym, "last_date": state.last_date, "state": state.to_dict()}
+    return rows_t, rows_c, state_row
+
+def main_incremental(defs, syms):
+    saved = load_states(syms)
+    print(f"[INFO] Incremental indicators for {len(syms)} symbols ({len(saved)} with saved state)...")
+    total_t = 0; total_c = 0; state_rows = []; done = []
+    with tqdm(total=len(syms), desc="Indicators/Candles (incremental)", unit="sym") as bar:
+        for sym in syms:
+            try:
+                res = compute_symbol_incremental(sym, defs, saved.get(sym))
+                if res is None: continue
+                rows_t, rows_c, state_row = res
+                ok_t = upsert_indicators(rows_t); total_t += len(rows_t)
+                ok_c = upsert_candles(rows_c); total_c += len(rows_c)
+                # الحالة لا تتقدّم فوق شموع لم تُكتب مؤشراتها، وإلا لن يُعاد حسابها أبداً
+                if ok_t and ok_c:
+                    if state_row: state_rows.append(state_row)
+                    done.append(sym)
+            except Exception as e:
+                print(f"[WARN] compute failed for {sym}: {e}"); traceback.print_exc()
+            finally:
+                bar.set_postfix({"last": sym, "tech_rows": total_t, "candle_rows": total_c}); bar.update(1)
+    save_states(state_rows)
+    print(f"[INFO] Done. Technical rows upserted: {total_t}, Candle rows upserted: {total_c}, States saved: {len(state_rows)}")
+    row_diff.report()
+    return done
+
+# -------- pipelined mode --------
+class StageCounter:
+    """عدّاد إنتاجية لمرحلة: عناصر، صفوف، وزمن انشغال (مجموع عبر الخيوط)."""
+
+    def __init__(self, name):
+        self.name, self.items, self.rows, self.busy = name, 0, 0, 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds, items=1, rows=0):
+        with self.lock:
+            self.items += items; self.rows += rows; self.busy += seconds
+
+    def summary(self):
+        rate = self.items / self.busy if self.busy > 0 else 0.0
+        out = f"{self.name}: {self.items} items in {self.busy:.1f}s busy ({rate:.1f}/s"
+        if self.rows:
+            out += f", {self.rows / self.busy if self.busy > 0 else 0.0:.0f} rows/s"
+        return out + ")"
+
+def _timed_fetch(sym, counter):
+    t0 = time.perf_counter()
+    hist = fetch_history(sym)
+    counter.add(time.perf_counter() - t0, rows=len(hist))
+    return hist
+
+def _writer(q, batch, counter, written):
+    """
+    يجمع صفوف عدة رموز ويكتبها عند بلوغ batch صف (أو عند النهاية).
+    written يُضاف إليها رموز الدفعات التي نجحت كتابتها كاملة (وحدها تُحفظ بصماتها).
+    """
+    buf_s, buf_t, buf_c = [], [], []
+    def flush():
+        nonlocal buf_s, buf_t, buf_c
+        if not buf_s: return
+        t0 = time.perf_counter()
+        try:
+            ok_t = upsert_indicators(buf_t); ok_c = upsert_candles(buf_c)
+            if ok_t and ok_c:
+                written.extend(buf_s)
+        except Exception as e:
+            print(f"[WARN] pipelined write failed: {e}")
+        counter.add(time.perf_counter() - t0, items=0, rows=len(buf_t) + len(buf_c))
+        buf_s, buf_t, buf_c = [], [], []
+    while True:
+        item = q.get()
+        if item is None:
+            flush(); return
+        sym, rows_t, rows_c = item
+        buf_s.append(sym); buf_t.extend(rows_t); buf_c.extend(rows_c)
+        counter.add(0.0)
+        if len(buf_t) + len(buf_c) >= batch:
+            flush()
+
+def main_pipelined(defs, syms):
+    """
+    نفس نتيجة الوضع التسلسلي مع تداخل المراحل:
+    - INDICATORS_FETCH_WORKERS خيط يجلب سجل الرموز القادمة، وبحد أقصى INDICATORS_QUEUE_DEPTH
+      رمزاً قيد الجلب أو بانتظار الحساب،
+    - الحساب في الخيط الرئيسي بترتيب الرموز،
+    - خيط كتابة واحد يستقبل الصفوف عبر طابور محدود ويكتبها بدفعات كبيرة متعددة الرموز.
+    """
+    batch = INDICATORS_WRITE_BATCH or (50000 if pg_bulk.enabled() else 1000)
+    depth = max(1, INDICATORS_QUEUE_DEPTH)
+    print(f"[INFO] Computing indicators & candles for {len(syms)} symbols "
+          f"(pipelined: {INDICATORS_FETCH_WORKERS} fetchers, depth {depth}, write batch {batch})...")
+    c_fetch, c_compute, c_write = StageCounter("fetch"), StageCounter("compute"), StageCounter("write")
+    write_q, done = queue.Queue(maxsize=depth), []
+    writer = threading.Thread(target=_writer, args=(write_q, batch, c_write, done), daemon=True)
+    writer.start()
+
+    total_t = 0; total_c = 0
+    t_start = time.perf_counter()
+    pending = deque()
+    todo = iter(syms)
+    with ThreadPoolExecutor(max_workers=max(1, INDICATORS_FETCH_WORKERS)) as pool, \
+         tqdm(total=len(syms), desc="Indicators/Candles (pipelined)", unit="sym") as bar:
+        def refill():
+            while len(pending) < depth:
+                sym = next(todo, None)
+                if sym is None: return
+                pending.append((sym, pool.submit(_timed_fetch, sym, c_fetch)))
+        refill()
+        while pending:
+            sym, fut = pending.popleft()
+            refill()
+            try:
+                hist = fut.result()
+                if hist.empty: continue
+                t0 = time.perf_counter()
+                hist = clean_history(hist)
+                _, rows_t, rows_c = compute_symbol(sym, hist, defs)
+                c_compute.add(time.perf_counter() - t0, rows=len(rows_t) + len(rows_c))
+                write_q.put((sym, rows_t, rows_c))  # يتوقف هنا إن امتلأ الطابور
+                total_t += len(rows_t); total_c += len(rows_c)
+            except Exception as e:
+                print(f"[WARN] compute failed for {sym}: {e}"); traceback.print_exc()
+            finally:
+                bar.set_postfix({"last": sym, "tech_rows": total_t, "candle_rows": total_c}); bar.update(1)
+    write_q.put(None)
+    writer.join()  # done مكتملة بعد انتهاء خيط الكتابة
+    wall = time.perf_counter() - t_start
+    print(f"[INFO] Done. Technical rows upserted: {total_t}, Candle rows upserted: {total_c}")
+    print(f"[INFO] pipeline {wall:.1f}s wall ({len(syms) / wall if wall > 0 else 0.0:.1f} sym/s) | "
+          f"{c_fetch.summary()} | {c_compute.summary()} | {c_write.summary()}")
+    row_diff.report()
+    return done
+
+# -------- server-side engine --------
+def run_sql_engine(cfg, syms):
+    """compute_indicators_sql لدفعة رموز؛ يعيد (technical_rows, candle_rows)."""
+    since = cold_tier.cutoff("technical_indicators") if cold_tier.COLD_TIERING else None
+    if pg_bulk.enabled():
+        conn = pg_bulk.get_connection()
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT public.compute_indicators_sql(%s::jsonb, %s, %s)", (json.dumps(cfg), list(syms), since))
+            res = cur.fetchone()[0]
+    else:
+        res = get_client().rpc("compute_indicators_sql",
+                               {"p_config": cfg, "p_symbols": list(syms), "p_since": since}).execute().data
+    return int(res.get("technical_rows") or 0), int(res.get("candle_rows") or 0)
+
+def main_sql(defs, syms):
+    """
+    المؤشرات والشموع تُحسب وتُكتب داخل القاعدة (نفس نتائج compute_technical_set و detect_candles).
+    مع DATABASE_URL: استدعاء واحد لكل الرموز؛ عبر PostgREST: دفعات INDICATORS_SQL_CHUNK رمزاً.
+    """
+    if get_client() is None and not pg_bulk.enabled():
+        return []
+    cfg = indicator_state.config_from_defs(defs)
+    chunk = max(1, len(syms) if pg_bulk.enabled() else INDICATORS_SQL_CHUNK)
+    print(f"[INFO] Computing indicators & candles for {len(syms)} symbols on the server (chunk {chunk})...")
+    total_t = 0; total_c = 0; done = []
+    with tqdm(total=len(syms), desc="Indicators/Candles (sql)", unit="sym") as bar:
+        for i in range(0, len(syms), chunk):
+            part = syms[i:i+chunk]
+            try:
+                n_t, n_c = run_sql_engine(cfg, part)
+                total_t += n_t; total_c += n_c
+                done.extend(part)
+            except Exception as e:
+                print(f"[WARN] compute_indicators_sql failed for {part[0]}..{part[-1]}: {e}")
+            finally:
+                bar.set_postfix({"tech_rows": total_t, "candle_rows": total_c}); bar.update(len(part))
+    print(f"[INFO] Done. Technical rows upserted: {total_t}, Candle rows upserted: {total_c}")
+    return done
+
 def main():
+    sb = get_client()
     defs = fetch_indicator_defs(); syms = load_symbols()
+    # تخطّي الرموز التي لم يتغيّر سجلها منذ آخر تشغيل ناجح
+    extra = fingerprints.config_digest(indicator_state.config_from_defs(defs))
+    todo, fps = fingerprints.filter_changed(sb, "indicators", syms, extra)
+    if len(todo) < len(syms):
+        print(f"[INFO] Unchanged since last run, skipped: {len(syms) - len(todo)}")
+    syms = todo
+    if INDICATORS_ENGINE == "sql":
+        done = main_sql(defs, syms)
+        fingerprints.save(sb, "indicators", fps, done)
+        return
+    if INDICATORS_INCREMENTAL:
+        done = main_incremental(defs, syms)
+        fingerprints.save(sb, "indicators", fps, done)
+        return
+    if INDICATORS_PIPELINED:
+        done = main_pipelined(defs, syms)
+        fingerprints.save(sb, "indicators", fps, done)
+        return
     print(f"[INFO] Computing indicators & candles for {len(syms)} symbols...")
-    total_t = 0; total_c = 0
+    total_t = 0; total_c = 0; done = []
     with tqdm(total=len(syms), desc="Indicators/Candles", unit="sym") as bar:
         for sym in syms:
             try:
                 hist = fetch_history(sym)
                 if hist.empty: bar.update(1); continue
-                hist = hist.sort_values("date").reset_index(drop=True)
-                for col in ["open","high","low","close","volume"]:
-                    if col in hist.columns: hist[col] = pd.to_numeric(hist[col], errors="coerce")
-                hist = hist.dropna(subset=["open","high","low","close"])
-
-                tech = compute_technical_set(hist, defs)
-                rows_t = []
-                idx_map = {i: hist.loc[i, "date"] for i in tech.index}
-                for i, row in tech.iterrows():
-                    values = {k: float(v) for k, v in row.items() if isinstance(v, (int,float,np.floating)) and not pd.isna(v)}
-                    if "macd_cross" in row and not pd.isna(row["macd_cross"]): values["macd_cross"] = int(row["macd_cross"])
-                    if "rsi_zone" in row and not pd.isna(row["rsi_zone"]):   values["rsi_zone"] = int(row["rsi_zone"])
-                    if not values: continue
-                    payload = {"stock_symbol": sym, "date": idx_map[i]}; payload.update(values)
-                    rows_t.append(payload)
-                upsert_indicators(rows_t); total_t += len(rows_t)
-
-                patts = detect_candles(hist)
-                rows_c = [{"stock_symbol": sym, "date": d, "pattern_name": name,
-                           "description": None, "bullish": bull, "confidence": conf}
-                          for d, name, bull, conf in patts]
-                upsert_candles(rows_c); total_c += len(rows_c)
+                hist = clean_history(hist)
+
+                _, rows_t, rows_c = compute_symbol(sym, hist, defs)
+                ok_t = upsert_indicators(rows_t); total_t += len(rows_t)
+                ok_c = upsert_candles(rows_c); total_c += len(rows_c)
+                # بصمة رمز فشلت كتابته تجعله يُتخطّى حتى يتغيّر سجله
+                if ok_t and ok_c: done.append(sym)
             except Exception as e:
                 print(f"[WARN] compute failed for {sym}: {e}"); traceback.print_exc()
             finally:
                 bar.set_postfix({"last": sym, "tech_rows": total_t, "candle_rows": total_c}); bar.update(1)
+    fingerprints.save(sb, "indicators", fps, done)
     print(f"[INFO] Done. Technical rows upserted: {total_t}, Candle rows upserted: {total_c}")
+    row_diff.report()
 
 if __name__ == "__main__":
     main()
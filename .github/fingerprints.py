@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+fingerprints.py
+---------------
+كشف التغيّر لكل رمز قبل المؤشرات والتوقعات: إذا لم يتغيّر historical_data للرمز منذ آخر
+تشغيل ناجح (عطلة، سهم موقوف، إعادة تشغيل) يُتخطّى الجلب والحساب والكتابة.
+
+- البصمة الحالية = آخر تاريخ + عدد الصفوف + checksum لآخر N شموع (OHLCV)،
+  تُحسب في استعلام تجميعي واحد عبر RPC get_history_fingerprints (migration_177).
+- البصمة المخزّنة في pipeline_fingerprints لكل (stock_symbol, stage) بعد نجاح المرحلة.
+- extra يُضاف للبصمة ليُعاد الحساب عند تغيّر الإعداد (مثلاً MODEL_VERSION أو indicator_definitions).
+
+عند أي خطأ (مثلاً الـ migration غير مطبّق) تُعامل كل الرموز كمتغيّرة.
+SKIP_UNCHANGED=0 يعطّل التخطّي بالكامل.
+"""
+
+import os, json, hashlib
+
+SKIP_UNCHANGED = os.getenv("SKIP_UNCHANGED", "1") == "1"
+FINGERPRINT_LAST_N = int(os.getenv("FINGERPRINT_LAST_N", "30"))
+CHUNK = 500  # أقل من حد الصفوف الافتراضي لـ PostgREST
+
+def config_digest(obj):
+    """بصمة قصيرة لإعداد (defs، نسخة نموذج...) لتُدمج في extra."""
+    raw = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()[:12]
+
+def fetch_current(sb, syms, extra=""):
+    """{symbol: fingerprint} من historical_data."""
+    out = {}
+    for i in range(0, len(syms), CHUNK):
+        res = sb.rpc("get_history_fingerprints",
+                     {"p_symbols": syms[i:i+CHUNK], "p_last_n": FINGERPRINT_LAST_N}).execute()
+        for r in (res.data or []):
+            out[r["stock_symbol"]] = f'{r["max_date"]}|{r["row_count"]}|{r["close_checksum"]}|{extra}'
+    return out
+
+def load_stored(sb, stage, syms):
+    out = {}
+    for i in range(0, len(syms), CHUNK):
+        res = (sb.table("pipeline_fingerprints").select("stock_symbol,fingerprint")
+                 .eq("stage", stage).in_("stock_symbol", syms[i:i+CHUNK]).execute())
+        for r in (res.data or []):
+            out[r["stock_symbol"]] = r["fingerprint"]
+    return out
+
+def filter_changed(sb, stage, syms, extra=""):
+    """
+    يعيد (todo, current): الرموز التي تغيّرت بصمتها، وقاموس البصمات الحالية
+    (يُمرَّر إلى save بعد نجاح المعالجة).
+    """
+    if sb is None or not SKIP_UNCHANGED or not syms:
+        return list(syms), {}
+    try:
+        current = fetch_current(sb, syms, extra)
+        stored = load_stored(sb, stage, syms)
+    except Exception as e:
+        print(f"[WARN] fingerprints unavailable ({stage}): {e}")
+        return list(syms), {}
+    todo = [s for s in syms if s not in current or stored.get(s) != current[s]]
+    return todo, current
+
+def save(sb, stage, current, done):
+    """يخزّن بصمات الرموز التي اكتملت بنجاح."""
+    if sb is None or not current: return
+    rows = [{"stock_symbol": s, "stage": stage, "fingerprint": current[s]} for s in done if s in current]
+    for i in range(0, len(rows), CHUNK):
+        try:
+            sb.table("pipeline_fingerprints").upsert(rows[i:i+CHUNK], on_conflict="stock_symbol,stage").execute()
+        except Exception as e:
+            print(f"[WARN] save fingerprints failed ({stage}): {e}")
@@ -12,24 +12,25 @@ forecast_generate_tracked_symbols_v6i_1day_silent.py
   stocks(symbol, is_tracked), historical_data, technical_indicators (اختياري), candles_results (اختياري), forecasts.
 """
 
-import os, sys, warnings, logging, contextlib, traceback, math, time
-import numpy as np
-import pandas as pd
-from dotenv import load_dotenv
-from supabase import create_client
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.preprocessing import RobustScaler
-from sklearn.pipeline import Pipeline
-from sklearn.linear_model import HuberRegressor
+import os, re, sys, json, warnings, logging, contextlib, traceback, math, time, argparse
+import fingerprints
+import row_diff
+import pipeline_core
+from pipeline_core import lazy_import
+
+# sklearn يُستورد داخل fit_predict_direct فقط، عند وجود رمز يحتاج تدريباً
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
 # ========== إعدادات ==========
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
 
 HORIZON = 1
-MODEL_VERSION = "forecast_tracked_v6i_1day_silent_guard20"
+# ميزانية الميزات (0 = كل الأعمدة كما كان). عند ضبطها تُختار أفضل MAX_FEATURES عمود لكل رمز
+MAX_FEATURES = int(os.getenv("MAX_FEATURES", "0"))
+FEATURE_MAX_CORR = 0.95       # عمود يرتبط بعمود مختار بأكثر من هذا يُعتبر مكرّراً
+FEATURE_RESELECT_DAYS = int(os.getenv("FEATURE_RESELECT_DAYS", "7"))
+FEATURE_BUDGET_COMPARE = os.getenv("FEATURE_BUDGET_COMPARE", "0") == "1"  # درّب الكامل أيضاً للمقارنة
+MODEL_VERSION = "forecast_tracked_v6i_1day_silent_guard20" + (f"_f{MAX_FEATURES}" if MAX_FEATURES else "")
 COVERAGE_TARGET = 0.80
 
 MIN_TRAIN_FLOOR = 80
@@ -40,7 +41,46 @@ MAX_LAG = 10
 MIN_EXTRA_NONNULL = 30
 MIN_EXTRA_DENSITY = 0.30  # 30%
 
-PAGE = 1000  # حجم الصفحة في جلب الرموز
+UPSERT_CHUNK = 1000  # حجم دفعة الكتابة إلى forecasts
+
+# القراءات لكل رمز تطلب آخر HIST_ROWS شمعة (تنازلياً ثم يُعاد ترتيبها): قراءة تصاعدية بلا صفحات
+# يقطعها حد PostgREST (1000 صف) من البداية فتعيد أقدم الشموع. التدريب يحتاج آخر MIN_TRAIN_CAP فقط.
+HIST_ROWS = int(os.getenv("FORECAST_HIST_ROWS", "1000"))
+
+# تحديث تراكمي للنماذج: يُحفظ مجمّع كل رمز (KNN+GBR) في MODEL_DIR، وفي اليوم التالي يُضاف
+# MODEL_WARM_TREES شجرة بـ warm_start على النافذة المزاحة ويُعاد ملاءمة KNN وهيوبر فقط.
+# التدريب الكامل كل MODEL_REFIT_DAYS يوماً، أو عند انجراف خطأ الذيل: متوسط الخطأ المطلق للمجمّع
+# المحفوظ على الشموع التي لم يرها (منذ آخر تدريب كامل) يتجاوز خطأ التوقع الساذج (عائد 0)
+# على نفس الذيل بنسبة MODEL_DRIFT_TOL.
+MODEL_INCREMENTAL = os.getenv("MODEL_INCREMENTAL", "0") == "1"
+MODEL_DIR = os.getenv("MODEL_DIR", ".model_cache")
+MODEL_WARM_TREES = int(os.getenv("MODEL_WARM_TREES", "25"))
+MODEL_MAX_TREES = int(os.getenv("MODEL_MAX_TREES", "1200"))  # بعده تدريب كامل حتى لا يتضخّم النموذج
+MODEL_REFIT_DAYS = int(os.getenv("MODEL_REFIT_DAYS", "7"))
+MODEL_DRIFT_TOL = float(os.getenv("MODEL_DRIFT_TOL", "0.25"))
+MODEL_DRIFT_MIN_ROWS = 3
+GBR_TREES = 800
+# إعدادات مجمّع الإنتاج (KNN+GBR) كما في fit_blend؛ نماذج الظل تغيّر بعضها
+BLEND_PARAMS = {"knn_neighbors": 12, "gbr_trees": GBR_TREES, "learning_rate": 0.05, "max_depth": 3,
+                "subsample": 0.9, "recency": 2.0, "train_cap": MIN_TRAIN_CAP}
+
+# جدولة بمهلة (--deadline أو FORECAST_DEADLINE، مثل 100m): الرموز تُرتَّب بالأولوية (المفضّلة لدى
+# المستخدمين ثم الأكبر market_cap)، وكل رمز يُدرَّب كاملاً فقط إن بقي وقت يكفيه مع النموذج
+# الخفيف لكل ما بعده؛ وإلا يُستخدم النموذج الخفيف (أشجار أقل) ويُوسَم LITE_MODEL_VERSION.
+FORECAST_DEADLINE = os.getenv("FORECAST_DEADLINE", "")
+LITE_GBR_TREES = 120
+LITE_LEARNING_RATE = 0.20
+LITE_MODEL_VERSION = MODEL_VERSION + "_lite"
+DEFAULT_COST_S = {"full": 8.0, "lite": 1.5}  # قبل وجود توقيتات سابقة
+COST_EWMA_ALPHA = 0.3
+DEADLINE_MARGIN = 0.05  # احتياط من المهلة للكتابة والتقييم في النهاية
+
+# نماذج الظل: قائمة JSON لإعدادات منافسة تُدرَّب على نفس مصفوفة الميزات المبنية للإنتاج
+# وتُكتب إلى forecast_shadow (migration_186) بـ model_version خاص بها، ولا تمسّ forecasts، مثل:
+#   SHADOW_MODELS='[{"model_version": "v6i_knn20", "knn_neighbors": 20},
+#                   {"model_version": "v6i_cap250", "train_cap": 250, "recency": 1.0}]'
+# المفاتيح المسموحة هي مفاتيح BLEND_PARAMS؛ الرموز التي تأخذ النموذج الخفيف لا تُشغَّل عليها.
+SHADOW_MODELS = os.getenv("SHADOW_MODELS", "")
 
 logging.basicConfig(level=logging.CRITICAL, format="%(message)s")
 warnings.filterwarnings("ignore")
@@ -58,56 +98,47 @@ def silence():
 
 # ========== Supabase I/O ==========
 def get_client():
-    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
+    sb = pipeline_core.get_client()
+    if sb is None:
         raise RuntimeError("بيئة .env لا تحتوي SUPABASE_URL أو SUPABASE_SERVICE_ROLE")
-    return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
+    return sb
 
 def list_tracked_symbols(sb):
-    symbols = []
-    start = 0
-    while True:
-        q = sb.table("stocks").select("symbol, is_tracked").eq("is_tracked", True).range(start, start + PAGE - 1)
-        res = q.execute()
-        rows = res.data or []
-        if not rows:
-            break
-        for r in rows:
-            sym = str(r.get("symbol","")).strip().upper()
-            if sym:
-                symbols.append(sym)
-        if len(rows) < PAGE:
-            break
-        start += PAGE
-    symbols = sorted(list({s for s in symbols if s}))
-    return symbols
+    symbols = [str(s).strip().upper() for s in pipeline_core.fetch_symbols(sb, tracked_only=True)]
+    return sorted({s for s in symbols if s})
 
 def fetch_hist(sb, sym):
     res = (sb.table("historical_data")
              .select("date, high, low, close, volume")
              .eq("stock_symbol", sym)
-             .order("date", desc=False).execute())
-    df = pd.DataFrame(res.data or [])
+             .order("date", desc=True).limit(HIST_ROWS).execute())
+    return normalize_hist(pd.DataFrame(res.data or []))
+
+def normalize_hist(df):
     if df.empty: 
         return pd.DataFrame()
+    df = df[["date","high","low","close","volume"]].copy()
     df["date"] = pd.to_datetime(df["date"]).dt.tz_localize(None)
     for c in ["high","low","close","volume"]:
         df[c] = pd.to_numeric(df[c], errors="coerce")
     df = df.dropna(subset=["close"]).drop_duplicates("date").sort_values("date").reset_index(drop=True)
     return df
 
+def normalize_extra(df):
+    if df.empty or "date" not in df.columns: return pd.DataFrame()
+    df = df.copy()
+    df["date"] = pd.to_datetime(df["date"]).dt.tz_localize(None)
+    drop = {"stock_symbol","id","created_at","updated_at","pattern_name","notes"}
+    keep = [c for c in df.columns if c not in drop]
+    return df[keep].drop_duplicates("date").sort_values("date").reset_index(drop=True)
+
 def fetch_indicators(sb, sym):
     try:
         res = (sb.table("technical_indicators")
                  .select("*")
                  .eq("stock_symbol", sym)
-                 .order("date", desc=False).execute())
-        di = pd.DataFrame(res.data or [])
-        if di.empty or "date" not in di.columns: return pd.DataFrame()
-        di["date"] = pd.to_datetime(di["date"]).dt.tz_localize(None)
-        drop = {"stock_symbol","id","created_at","updated_at","pattern_name","notes"}
-        keep = [c for c in di.columns if c not in drop]
-        di = di[keep].drop_duplicates("date").reset_index(drop=True)
-        return di
+                 .order("date", desc=True).limit(HIST_ROWS).execute())
+        return normalize_extra(pd.DataFrame(res.data or []))
     except Exception:
         return pd.DataFrame()
 
@@ -116,20 +147,325 @@ def fetch_candles(sb, sym):
         res = (sb.table("candles_results")
                  .select("*")
                  .eq("stock_symbol", sym)
-                 .order("date", desc=False).execute())
-        dc = pd.DataFrame(res.data or [])
-        if dc.empty or "date" not in dc.columns: return pd.DataFrame()
-        dc["date"] = pd.to_datetime(dc["date"]).dt.tz_localize(None)
-        drop = {"stock_symbol","id","created_at","updated_at","pattern_name","notes"}
-        keep = [c for c in dc.columns if c not in drop]
-        dc = dc[keep].drop_duplicates("date").reset_index(drop=True)
-        return dc
+                 .order("date", desc=True).limit(HIST_ROWS).execute())
+        return normalize_extra(pd.DataFrame(res.data or []))
     except Exception:
         return pd.DataFrame()
 
+class ForecastBatch:
+    """
+    يجمع صفوف forecasts ويكتبها على دفعات ضمن بروتوكول الدُفعة (migration_179):
+    begin_forecast_batch قبل أول كتابة لكل forecast_date، ثم complete_forecast_batch مرة
+    واحدة في النهاية فيُقيَّم كل تاريخ مرة واحدة بدل trigger لكل صف.
+    إن لم تكن الدوال موجودة يُكمل الكتابة ويبقى التقييم على الـ trigger القديم.
+    failed = الرموز التي فشلت كتابة صفوفها (لا تُحفظ بصماتها).
+    """
+
+    def __init__(self, sb, chunk=UPSERT_CHUNK):
+        self.sb, self.chunk = sb, chunk
+        self.pending, self.dates, self.failed = [], set(), set()
+
+    def add(self, rows):
+        self.pending.extend(rows or [])
+        if len(self.pending) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        new_dates = {r["forecast_date"] for r in self.pending} - self.dates
+        if new_dates:
+            try:
+                self.sb.rpc("begin_forecast_batch", {"p_forecast_dates": sorted(new_dates)}).execute()
+            except Exception as e:
+                print(f"[WARN] begin_forecast_batch failed: {e}")
+            self.dates |= new_dates
+        try:
+            upsert_forecasts(self.sb, self.pending)
+        except Exception as e:
+            print(f"[WARN] upsert forecasts failed ({len(self.pending)} rows): {e}")
+            self.failed.update(r["stock_symbol"] for r in self.pending)
+        self.pending = []
+
+    def complete(self):
+        """يكتب المتبقي ثم يطلب التقييم لكل forecast_date؛ يعيد عدد الصفوف المقيّمة أو None."""
+        self.flush()
+        if not self.dates:
+            return 0
+        try:
+            res = self.sb.rpc("complete_forecast_batch", {"p_forecast_dates": sorted(self.dates)}).execute()
+            return res.data
+        except Exception as e:
+            print(f"[WARN] complete_forecast_batch failed: {e}")
+            return None
+
 def upsert_forecasts(sb, rows):
+    # إعادة كتابة توقع مطابق تُطلق trigger التقييم بلا فائدة؛ نرسل المتغيّر فقط
+    rows = row_diff.filter_changed(sb, "forecasts", rows)
     if rows:
         sb.table("forecasts").upsert(rows, on_conflict="stock_symbol,forecast_date").execute()
+        row_diff.mark_written(sb, "forecasts", rows)
+
+# ========== ميزانية الميزات ==========
+# symbol -> {"features": [...], "fresh": bool}؛ تُحمَّل من forecast_feature_sets (migration_181)
+FEATURE_SETS = {}
+# لكل رمز: عدد الأعمدة قبل/بعد، زمن التدريب، tail-MAPE (ومثلها للكامل في وضع المقارنة)
+FEATURE_STATS = []
+
+def load_feature_sets(sb, syms, chunk=500):
+    """يحمّل المجموعات المختارة سابقاً والتي ما زالت صالحة لنفس MAX_FEATURES."""
+    FEATURE_SETS.clear()
+    if sb is None or not MAX_FEATURES or not syms:
+        return
+    cutoff = (pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=FEATURE_RESELECT_DAYS)).isoformat()
+    try:
+        for i in range(0, len(syms), chunk):
+            res = (sb.table("forecast_feature_sets").select("stock_symbol,features")
+                     .in_("stock_symbol", syms[i:i+chunk]).eq("max_features", MAX_FEATURES)
+                     .gte("selected_at", cutoff).execute())
+            for r in (res.data or []):
+                FEATURE_SETS[r["stock_symbol"]] = {"features": list(r["features"] or []), "fresh": False}
+    except Exception as e:
+        print(f"[WARN] load forecast_feature_sets failed: {e}")
+
+def save_feature_sets(sb, chunk=500):
+    """يخزّن المجموعات التي اختيرت في هذا التشغيل فقط."""
+    if sb is None or not MAX_FEATURES:
+        return
+    rows = [{"stock_symbol": sym, "max_features": MAX_FEATURES, "features": fs["features"],
+             "n_candidates": fs.get("n_candidates"), "selected_at": pd.Timestamp.now(tz="UTC").isoformat()}
+            for sym, fs in FEATURE_SETS.items() if fs.get("fresh")]
+    for i in range(0, len(rows), chunk):
+        try:
+            sb.table("forecast_feature_sets").upsert(rows[i:i+chunk], on_conflict="stock_symbol").execute()
+        except Exception as e:
+            print(f"[WARN] save forecast_feature_sets failed: {e}")
+
+def select_features(X, y, names, budget, max_corr=FEATURE_MAX_CORR):
+    """
+    اختيار بثلاث خطوات على مصفوفة التدريب:
+    1) إسقاط الأعمدة شبه الثابتة (تباين ~ 0)،
+    2) ترتيب الباقي حسب |ارتباط| العمود بالهدف y،
+    3) أخذها بالترتيب مع تخطّي أي عمود يرتبط بعمود مختار بأكثر من max_corr
+       (عناقيد اللواحق المتقاربة)، ثم ملء الميزانية من المتخطّى إن لزم.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    std = X.std(axis=0)
+    ok = np.flatnonzero(std > 1e-12)
+    if len(ok) <= budget:
+        return [names[j] for j in ok]
+    Z = (X[:, ok] - X[:, ok].mean(axis=0)) / std[ok]
+    y_std = float(np.std(y))
+    yz = (y - np.mean(y)) / (y_std if y_std > 0 else 1.0)
+    score = np.abs(Z.T @ yz) / len(y)
+    order = np.argsort(-score, kind="stable")
+
+    chosen, skipped = [], []
+    for k in order:
+        if len(chosen) >= budget:
+            break
+        if chosen and np.max(np.abs(Z[:, chosen].T @ Z[:, k]) / len(y)) > max_corr:
+            skipped.append(k); continue
+        chosen.append(k)
+    chosen += skipped[:budget - len(chosen)]
+    return [names[ok[k]] for k in sorted(chosen)]
+
+def feature_budget(sym, X, y, names):
+    """يعيد فهارس الأعمدة المستخدمة في التدريب (كلها إن لم تُضبط الميزانية)."""
+    if not MAX_FEATURES or len(names) <= MAX_FEATURES:
+        return list(range(len(names)))
+    cached = FEATURE_SETS.get(sym) if sym else None
+    pos = {c: j for j, c in enumerate(names)}
+    if cached and all(c in pos for c in cached["features"]):
+        return [pos[c] for c in cached["features"]]
+    selected = select_features(X, y, names, MAX_FEATURES)
+    if sym:
+        FEATURE_SETS[sym] = {"features": selected, "fresh": True, "n_candidates": len(names)}
+    return [pos[c] for c in selected]
+
+def report_feature_budget():
+    if not FEATURE_STATS:
+        return
+    n = len(FEATURE_STATS)
+    avg = lambda k: sum(s[k] for s in FEATURE_STATS) / n
+    msg = (f"[INFO] features: {avg('n_in'):.0f} -> {avg('n_out'):.0f} avg over {n} symbols, "
+           f"fit {avg('fit_s'):.2f}s, tail MAPE {avg('tail_mape'):.4f}")
+    full = [s for s in FEATURE_STATS if "full_fit_s" in s]
+    if full:
+        m = len(full)
+        msg += (f" | full set: fit {sum(s['full_fit_s'] for s in full)/m:.2f}s, "
+                f"tail MAPE {sum(s['full_tail_mape'] for s in full)/m:.4f} ({m} symbols)")
+    print(msg)
+
+# ========== النماذج المحفوظة (MODEL_INCREMENTAL) ==========
+# لكل رمز: "full" أو "warm" وسبب التدريب الكامل
+MODEL_STATS = []
+
+def _model_path(sym):
+    return os.path.join(MODEL_DIR, f"{sym}.joblib")
+
+def load_model_state(sym):
+    import joblib
+    try:
+        path = _model_path(sym)
+        return joblib.load(path) if os.path.exists(path) else None
+    except Exception as e:
+        print(f"[WARN] load model state failed for {sym}: {e}")
+        return None
+
+def save_model_state(sym, state):
+    import joblib
+    try:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        tmp = _model_path(sym) + ".tmp"
+        joblib.dump(state, tmp, compress=3)
+        os.replace(tmp, _model_path(sym))
+    except Exception as e:
+        print(f"[WARN] save model state failed for {sym}: {e}")
+
+def full_refit_reason(state, features, today):
+    """سبب التدريب الكامل أو None إذا كان التحديث الدافئ ممكناً."""
+    if state is None:
+        return "no saved model"
+    if state.get("model_version") != MODEL_VERSION:
+        return "model version changed"
+    if state.get("features") != features:
+        return "feature set changed"
+    if (today - state["full_fit_date"]).days >= MODEL_REFIT_DAYS:
+        return "scheduled refit"
+    if state["gbr"].n_estimators + MODEL_WARM_TREES > MODEL_MAX_TREES:
+        return "tree cap"
+    return None
+
+def warm_update(state, X, y, params=None):
+    """
+    KNN يُعاد ملاءمته (ذاكرة فقط) و GBR يكمل من أشجاره الحالية بـ MODEL_WARM_TREES شجرة جديدة،
+    بنفس ترجيح الحداثة الذي يستعمله fit_blend (params["recency"]).
+    """
+    p = params or BLEND_PARAMS
+    t0 = time.perf_counter()
+    knn, gbr = state["knn"], state["gbr"]
+    t = np.arange(len(X))
+    rec = (t - t.min()) / max(1, (t.max() - t.min()))
+    knn.fit(X, y)
+    gbr.set_params(warm_start=True, n_estimators=gbr.n_estimators + MODEL_WARM_TREES)
+    gbr.fit(X, y, sample_weight=np.exp(p["recency"] * rec))
+    p1 = knn.predict(X)
+    p2 = gbr.predict(X)
+    w1, w2 = wf_tail_weights(y, p1, p2, TAIL_WF)
+    pred_hist = (w1*p1 + w2*p2)
+    return knn, gbr, w1, w2, pred_hist, time.perf_counter() - t0
+
+def tail_drift(state, X, y, dates):
+    """
+    يقيّم المجمّع المحفوظ (قبل التحديث) على الصفوف الأحدث من آخر تدريب له ويضيف أخطاءها
+    إلى state["oos_abs"]؛ يعيد True إذا تجاوز متوسطها خطأ التوقع الساذج بنسبة MODEL_DRIFT_TOL.
+    """
+    new = dates > state["last_train_date"]
+    if new.any():
+        w1, w2 = state["weights"]
+        pred = w1 * state["knn"].predict(X[new]) + w2 * state["gbr"].predict(X[new])
+        state["oos_abs"] = (state["oos_abs"] + np.abs(y[new] - pred).tolist())[-TAIL_WF:]
+    errs = state["oos_abs"]
+    if len(errs) < MODEL_DRIFT_MIN_ROWS:
+        return False
+    naive = float(np.mean(np.abs(y[-TAIL_WF:])))
+    return float(np.mean(errs)) > naive * (1.0 + MODEL_DRIFT_TOL)
+
+def fit_or_update(sym, X, y, features, dates, params=None):
+    """مثل fit_blend، لكنه يحدّث النموذج المحفوظ بدل التدريب من الصفر متى أمكن."""
+    today = pd.Timestamp.now(tz="UTC").date()
+    state = load_model_state(sym)
+    reason = full_refit_reason(state, features, today)
+    if reason is None and tail_drift(state, X, y, dates):
+        reason = "tail error drift"
+    if reason is None:
+        knn, gbr, w1, w2, pred_hist, secs = warm_update(state, X, y, params)
+        state.update(knn=knn, gbr=gbr, weights=(w1, w2), last_train_date=dates[-1])
+        save_model_state(sym, state)
+        MODEL_STATS.append({"mode": "warm", "fit_s": secs})
+        return knn, gbr, w1, w2, pred_hist, secs
+    knn, gbr, w1, w2, pred_hist, secs = fit_blend(X, y, params=params)
+    save_model_state(sym, {
+        "model_version": MODEL_VERSION, "features": features, "knn": knn, "gbr": gbr,
+        "weights": (w1, w2), "full_fit_date": today, "last_train_date": dates[-1], "oos_abs": [],
+    })
+    MODEL_STATS.append({"mode": "full", "fit_s": secs, "reason": reason})
+    return knn, gbr, w1, w2, pred_hist, secs
+
+def report_model_updates():
+    if not MODEL_STATS:
+        return
+    warm = [s for s in MODEL_STATS if s["mode"] == "warm"]
+    full = [s for s in MODEL_STATS if s["mode"] == "full"]
+    avg = lambda xs: sum(s["fit_s"] for s in xs) / len(xs) if xs else 0.0
+    reasons = {}
+    for s in full:
+        reasons[s["reason"]] = reasons.get(s["reason"], 0) + 1
+    print(f"[INFO] models: warm {len(warm)} ({avg(warm):.2f}s avg), full {len(full)} ({avg(full):.2f}s avg)"
+          + (" | " + ", ".join(f"{k}: {v}" for k, v in sorted(reasons.items())) if reasons else ""))
+
+# ========== نماذج الظل (SHADOW_MODELS) ==========
+def parse_shadow_models(text):
+    """يعيد [{model_version, ...BLEND_PARAMS}] من نص JSON؛ إعداد غير صالح يعطّل وضع الظل بتحذير."""
+    if not text.strip():
+        return []
+    try:
+        specs = json.loads(text)
+        if not isinstance(specs, list):
+            raise ValueError("expected a JSON list")
+        models, seen = [], {MODEL_VERSION, LITE_MODEL_VERSION}
+        for spec in specs:
+            version = spec.get("model_version") if isinstance(spec, dict) else None
+            if not version or not isinstance(version, str):
+                raise ValueError(f"missing model_version in {spec!r}")
+            if version in seen:
+                raise ValueError(f"duplicate model_version {version!r}")
+            unknown = set(spec) - set(BLEND_PARAMS) - {"model_version"}
+            if unknown:
+                raise ValueError(f"unknown keys for {version!r}: {', '.join(sorted(unknown))}")
+            params = dict(BLEND_PARAMS)
+            for k, v in spec.items():
+                if k == "model_version":
+                    continue
+                # لا تحويل ضمني ("0.1" أو 2.7 لعدد الأشجار)؛ العدد الصحيح مقبول لحقل عشري
+                kind = type(BLEND_PARAMS[k])
+                allowed = (int, float) if kind is float else (kind,)
+                if isinstance(v, bool) or not isinstance(v, allowed):
+                    raise ValueError(f"{k} for {version!r} must be {kind.__name__}, got {v!r}")
+                params[k] = kind(v)
+            seen.add(version)
+            models.append({"model_version": version, "params": params})
+        return models
+    except Exception as e:
+        print(f"[WARN] invalid SHADOW_MODELS, shadow mode disabled: {e}")
+        return []
+
+SHADOWS = parse_shadow_models(SHADOW_MODELS)
+# صفوف forecast_shadow المتراكمة في هذا التشغيل، وزمن تدريب كل نموذج ظل
+SHADOW_ROWS = []
+SHADOW_STATS = {}
+
+def save_shadow_forecasts(sb, chunk=UPSERT_CHUNK):
+    """يكتب صفوف الظل دفعة واحدة في النهاية؛ فشلها لا يمسّ توقعات الإنتاج."""
+    if sb is None or not SHADOW_ROWS:
+        return
+    for i in range(0, len(SHADOW_ROWS), chunk):
+        try:
+            sb.table("forecast_shadow").upsert(SHADOW_ROWS[i:i+chunk],
+                                               on_conflict="stock_symbol,forecast_date,model_version").execute()
+        except Exception as e:
+            print(f"[WARN] save forecast_shadow failed: {e}")
+    SHADOW_ROWS.clear()
+
+def report_shadow():
+    if not SHADOW_STATS:
+        return
+    print("[INFO] shadow: " + ", ".join(
+        f"{v} {s['n']} symbols ({s['fit_s'] / max(1, s['n']):.2f}s avg"
+        + (f", {s['failed']} failed" if s["failed"] else "") + ")"
+        for v, s in SHADOW_STATS.items()))
 
 # ========== ميزات عامة (Robust) ==========
 def robust_feature_frame(df_merge):
@@ -186,10 +522,10 @@ def robust_feature_frame(df_merge):
     return work, kept_extras
 
 # ========== إعداد XY للنماذج المباشرة ==========
-def prepare_xy(df_feat, df_hist, horizon):
+def prepare_xy(df_feat, df_hist, horizon, return_dates=False):
     hist = df_hist.copy().sort_values("date").reset_index(drop=True)
     if df_feat.empty or hist.empty:
-        return np.zeros((0,1)), np.zeros((0,))
+        return (np.zeros((0,1)), np.zeros((0,))) + ((np.zeros((0,)),) if return_dates else ())
     start_dt = df_feat["date"].iloc[0]
     hist = hist[hist["date"] >= start_dt].reset_index(drop=True)
 
@@ -202,38 +538,49 @@ def prepare_xy(df_feat, df_hist, horizon):
     Z = pd.merge(X, Y, on="date", how="inner")
     y_final = Z["y"].values
     X_final = Z.drop(columns=["date","y"]).values
+    if return_dates:
+        return X_final, y_final, Z["date"].values
     return X_final, y_final
 
-def wf_tail_weights(y_true, pred_knn, pred_gbr, tail=TAIL_WF):
+def tail_mape(y_true, pred, tail=TAIL_WF):
     a = np.array(y_true[-tail:]) if len(y_true)>tail else np.array(y_true)
-    p1= np.array(pred_knn[-len(a):]); p2 = np.array(pred_gbr[-len(a):])
+    p = np.array(pred[-len(a):])
     denom = np.clip(np.abs(a), 1e-6, None)
-    m1 = float(np.mean(np.abs(a - p1)/denom))
-    m2 = float(np.mean(np.abs(a - p2)/denom))
-    if not np.isfinite(m1): m1 = 1.0
-    if not np.isfinite(m2): m2 = 1.0
+    m = float(np.mean(np.abs(a - p)/denom))
+    return m if np.isfinite(m) else 1.0
+
+def wf_tail_weights(y_true, pred_knn, pred_gbr, tail=TAIL_WF):
+    m1 = tail_mape(y_true, pred_knn, tail)
+    m2 = tail_mape(y_true, pred_gbr, tail)
     w_knn = np.clip(m2/(m1+m2), 0.20, 0.80)
     w_gbr = 1.0 - w_knn
     return float(w_knn), float(w_gbr)
 
-def fit_predict_direct(df_feat, df_hist, horizon):
-    X, y = prepare_xy(df_feat, df_hist, horizon)
-    if len(X) > MIN_TRAIN_CAP:
-        X = X[-MIN_TRAIN_CAP:]; y = y[-MIN_TRAIN_CAP:]
-    if len(X) < MIN_TRAIN_FLOOR:
-        return None, None, None, None, None, None
-
+def fit_blend(X, y, lite=False, params=None):
+    """
+    يدرّب KNN + GBR ويعيد (knn, gbr, w1, w2, pred_hist, seconds)؛ lite = أشجار أقل بمعدل تعلّم أعلى.
+    params يغيّر إعدادات BLEND_PARAMS (نماذج الظل).
+    """
+    p = params or BLEND_PARAMS
+    from sklearn.neighbors import KNeighborsRegressor
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.preprocessing import RobustScaler
+    from sklearn.pipeline import Pipeline
+
+    t0 = time.perf_counter()
     # KNN محلي
     knn = Pipeline([("sc", RobustScaler()),
-                    ("knn", KNeighborsRegressor(n_neighbors=12, weights="distance"))])
+                    ("knn", KNeighborsRegressor(n_neighbors=p["knn_neighbors"], weights="distance"))])
 
     # GBR مع ترجيح حداثة (أسي)
     t = np.arange(len(X))
     rec = (t - t.min()) / max(1, (t.max() - t.min()))
-    w_rec = np.exp(2.0 * rec)
+    w_rec = np.exp(p["recency"] * rec)
     gbr = GradientBoostingRegressor(
         loss="huber", alpha=0.9,
-        n_estimators=800, learning_rate=0.05, max_depth=3, subsample=0.9, random_state=42
+        n_estimators=LITE_GBR_TREES if lite else p["gbr_trees"],
+        learning_rate=LITE_LEARNING_RATE if lite else p["learning_rate"],
+        max_depth=p["max_depth"], subsample=p["subsample"], random_state=42
     )
 
     knn.fit(X, y)
@@ -243,6 +590,51 @@ def fit_predict_direct(df_feat, df_hist, horizon):
     p2 = gbr.predict(X)
     w1, w2 = wf_tail_weights(y, p1, p2, TAIL_WF)
     pred_hist = (w1*p1 + w2*p2)
+    return knn, gbr, w1, w2, pred_hist, time.perf_counter() - t0
+
+def fit_predict_direct(df_feat, df_hist, horizon, sym=None, lite=False, xy=None):
+    """xy = ناتج prepare_xy(..., return_dates=True) إن كان مبنياً مسبقاً (يُشارَك مع نماذج الظل)."""
+    X, y, dates = xy if xy is not None else prepare_xy(df_feat, df_hist, horizon, return_dates=True)
+    if len(X) > MIN_TRAIN_CAP:
+        X = X[-MIN_TRAIN_CAP:]; y = y[-MIN_TRAIN_CAP:]; dates = dates[-MIN_TRAIN_CAP:]
+    if len(X) < MIN_TRAIN_FLOOR:
+        return None, None, None, None, None, None
+
+    names = [c for c in df_feat.columns if c != "date"]
+    cols = feature_budget(sym, X, y, names)
+    if lite:
+        knn, gbr, w1, w2, pred_hist, fit_s = fit_blend(X[:, cols], y, lite=True)
+    elif MODEL_INCREMENTAL and sym:
+        knn, gbr, w1, w2, pred_hist, fit_s = fit_or_update(sym, X[:, cols], y, [names[j] for j in cols], dates)
+    else:
+        knn, gbr, w1, w2, pred_hist, fit_s = fit_blend(X[:, cols], y)
+    if MAX_FEATURES and not lite:
+        stats = {"n_in": len(names), "n_out": len(cols), "fit_s": fit_s, "tail_mape": tail_mape(y, pred_hist)}
+        if FEATURE_BUDGET_COMPARE and len(cols) < len(names):
+            *_, full_pred, full_s = fit_blend(X, y)
+            stats.update(full_fit_s=full_s, full_tail_mape=tail_mape(y, full_pred))
+        FEATURE_STATS.append(stats)
+    return calibrated_predict(df_feat, cols, knn, gbr, w1, w2, y, pred_hist)
+
+def fit_predict_shadow(df_feat, xy, sym, params):
+    """
+    نموذج ظل على نفس المصفوفة ونفس أعمدة feature_budget: تدريب كامل بإعداداته دائماً
+    (بلا تحديث تراكمي ولا FEATURE_STATS) ثم نفس المعايرة. يعيد (نتيجة fit_predict_direct، seconds).
+    """
+    X, y, _ = xy
+    cap = params["train_cap"]
+    if len(X) > cap:
+        X = X[-cap:]; y = y[-cap:]
+    if len(X) < MIN_TRAIN_FLOOR:
+        return (None,) * 6, 0.0
+    names = [c for c in df_feat.columns if c != "date"]
+    cols = feature_budget(sym, X, y, names)
+    knn, gbr, w1, w2, pred_hist, fit_s = fit_blend(X[:, cols], y, params=params)
+    return calibrated_predict(df_feat, cols, knn, gbr, w1, w2, y, pred_hist), fit_s
+
+def calibrated_predict(df_feat, cols, knn, gbr, w1, w2, y, pred_hist):
+    """معايرة هيوبر على الذيل ثم توقع آخر صف؛ يعيد (r_hat, w1, w2, y, pred_hist, calib)."""
+    from sklearn.linear_model import HuberRegressor
 
     # معايرة هيوبر على الذيل
     tail = min(TAIL_WF, len(y))
@@ -256,7 +648,7 @@ def fit_predict_direct(df_feat, df_hist, horizon):
     else:
         a_lin, b_lin = 1.0, 0.0
 
-    x_last = df_feat.drop(columns=["date"]).iloc[[-1]].values
+    x_last = df_feat.drop(columns=["date"]).iloc[[-1]].values[:, cols]
     r_hat_raw = float(w1 * knn.predict(x_last)[0] + w2 * gbr.predict(x_last)[0])
     r_hat = float(a_lin * r_hat_raw + b_lin)
 
@@ -300,13 +692,13 @@ def apply_min_band(y, lo, hi, last_price):
     return lo, hi
 
 # ========== تنبؤ رمز واحد ==========
-def forecast_one_symbol(sb, sym):
-    dfh = fetch_hist(sb, sym)
-    if dfh is None or dfh.empty or len(dfh) < (MIN_TRAIN_FLOOR + HORIZON + MAX_LAG):
-        return False  # SKIP
+def has_enough_history(dfh):
+    return dfh is not None and not dfh.empty and len(dfh) >= (MIN_TRAIN_FLOOR + HORIZON + MAX_LAG)
 
-    dfi = fetch_indicators(sb, sym)
-    dfc = fetch_candles(sb, sym)
+def forecast_rows(sym, dfh, dfi, dfc, lite=False):
+    """يبني صفوف forecasts لرمز واحد من بيانات جاهزة في الذاكرة؛ None عند التخطي."""
+    if not has_enough_history(dfh):
+        return None  # SKIP
 
     dfm = dfh.copy()
     for extra in [dfi, dfc]:
@@ -317,23 +709,46 @@ def forecast_one_symbol(sb, sym):
     df_feat, kept_extras = robust_feature_frame(dfm)
     nrows = df_feat.shape[0]
     if nrows < (MIN_TRAIN_FLOOR + HORIZON):
-        return False  # SKIP
+        return None  # SKIP
 
     last_price = float(dfh["close"].iloc[-1])
     last_date  = pd.to_datetime(dfh["date"]).max().date()
     future_date = pd.bdate_range(pd.Timestamp(last_date) + pd.offsets.BDay(1), periods=HORIZON).date[0]
 
-    # توقع مباشر + معايرة (D+1)
+    # توقع مباشر + معايرة (D+1)؛ المصفوفة تُبنى مرة واحدة وتُشارَك مع نماذج الظل
     base_hist = dfh[dfh["date"]>=df_feat["date"].iloc[0]]
-    r1, w1_knn, w1_gbr, y1_hist, y1_pred_hist, calib1 = fit_predict_direct(df_feat, base_hist, 1)
+    xy = prepare_xy(df_feat, base_hist, 1, return_dates=True)
+    r1, w1_knn, w1_gbr, y1_hist, y1_pred_hist, calib1 = fit_predict_direct(df_feat, base_hist, 1, sym, lite, xy=xy)
     if r1 is None:
-        return False  # SKIP
+        return None  # SKIP
+
+    cap1 = cap1_empirical(dfh)
+    rows = [forecast_row(sym, future_date, last_price, cap1, r1, y1_hist, y1_pred_hist,
+                         LITE_MODEL_VERSION if lite else MODEL_VERSION)]
 
+    if SHADOWS and not lite:
+        for shadow in SHADOWS:
+            version = shadow["model_version"]
+            stats = SHADOW_STATS.setdefault(version, {"n": 0, "failed": 0, "fit_s": 0.0})
+            try:
+                (r, _, _, y_hist, pred_hist, _), fit_s = fit_predict_shadow(df_feat, xy, sym, shadow["params"])
+                if r is None:
+                    continue
+                row = forecast_row(sym, future_date, last_price, cap1, r, y_hist, pred_hist, version)
+                row["evaluated_at"] = None  # توقع جديد لنفس اليوم يُقيَّم من جديد
+                SHADOW_ROWS.append(row)
+                stats["n"] += 1; stats["fit_s"] += fit_s
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"[WARN] shadow model {version} failed for {sym}: {e}")
+    return rows
+
+def forecast_row(sym, future_date, last_price, cap1, r1, y1_hist, y1_pred_hist, model_version):
+    """صف توقع D+1 من العائد المعاير: حارس + Conformal من بواقي الذيل + حد أدنى للنطاق."""
     # سعر خام
     mid1_raw = float(last_price * (1.0 + r1))
 
     # حارس D+1
-    cap1 = cap1_empirical(dfh)
     y1, lo1_cap, hi1_cap = guard_price(last_price, mid1_raw, cap1)
 
     # Conformal من بواقي الذيل
@@ -344,7 +759,7 @@ def forecast_one_symbol(sb, sym):
     lo1 = max(lo1_cap, y1 - wabs1); hi1 = min(hi1_cap, y1 + wabs1)
     lo1, hi1 = apply_min_band(y1, lo1, hi1, last_price)
 
-    rows = [{
+    return {
         "stock_symbol": sym,
         "forecast_date": pd.Timestamp(future_date).date().isoformat(),
         "predicted_price": round(float(y1), 4),
@@ -352,40 +767,163 @@ def forecast_one_symbol(sb, sym):
         "predicted_lo": round(float(lo1), 4),
         "predicted_hi": round(float(hi1), 4),
         "coverage_target": float(COVERAGE_TARGET),
-        "model_version": MODEL_VERSION,
-    }]
+        "model_version": model_version,
+    }
+
+def fetch_and_forecast(sb, sym, lite=False):
+    dfh = fetch_hist(sb, sym)
+    if not has_enough_history(dfh):
+        return None  # SKIP
+
+    dfi = fetch_indicators(sb, sym)
+    dfc = fetch_candles(sb, sym)
+    return forecast_rows(sym, dfh, dfi, dfc, lite)
+
+def forecast_one_symbol(sb, sym):
+    rows = fetch_and_forecast(sb, sym)
+    if rows is None:
+        return False  # SKIP
 
     upsert_forecasts(sb, rows)
     return True  # OK
 
+# ========== الجدولة بمهلة ==========
+def parse_duration(text):
+    """'100m' / '1h30m' / '5400s' / '90' (دقائق) -> ثوانٍ؛ None للنص الفارغ."""
+    text = (text or "").strip().lower()
+    if not text:
+        return None
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text) * 60
+    parts = re.findall(r"(\d+(?:\.\d+)?)([hms])", text)
+    if not parts or "".join(n + u for n, u in parts) != text:
+        raise ValueError(f"Invalid duration: {text!r} (use e.g. 100m, 1h30m, 5400s)")
+    return sum(float(n) * {"h": 3600, "m": 60, "s": 1}[u] for n, u in parts)
+
+class DeadlineScheduler:
+    """
+    يرتّب الرموز بالأولوية ويقرّر لكل رمز full أو lite حتى ينتهي الكل قبل المهلة:
+    الرمز يأخذ النموذج الكامل فقط إذا كان الوقت المتبقي يكفي كلفته الكاملة + الكلفة الخفيفة
+    لكل الرموز بعده. الكلفة = متوسط متحرك للثواني المسجّلة في forecast_symbol_costs (migration_183).
+    """
+
+    def __init__(self, sb, syms, deadline_s, started=None, chunk=500):
+        self.sb = sb
+        self.started = time.monotonic() if started is None else started
+        self.deadline = deadline_s * (1.0 - DEADLINE_MARGIN)
+        info = {}
+        try:
+            for i in range(0, len(syms), chunk):
+                res = sb.rpc("get_forecast_priorities", {"p_symbols": syms[i:i+chunk]}).execute()
+                for r in (res.data or []):
+                    info[r["stock_symbol"]] = r
+        except Exception as e:
+            print(f"[WARN] get_forecast_priorities failed, keeping alphabetical order: {e}")
+            info = {}
+        self.info = info
+        self.order = sorted(syms, key=lambda s: (-(info.get(s, {}).get("favorite_count") or 0),
+                                                 -(info.get(s, {}).get("market_cap") or 0), s))
+        self.cost = {}
+        for mode in ("full", "lite"):
+            known = sorted(r[f"{mode}_seconds"] for r in info.values() if r.get(f"{mode}_seconds"))
+            default = known[len(known) // 2] if known else DEFAULT_COST_S[mode]
+            self.cost[mode] = {s: (info.get(s, {}).get(f"{mode}_seconds") or default) for s in syms}
+        self.timings = {}  # (symbol, mode) -> seconds
+
+    def remaining(self):
+        return self.deadline - (time.monotonic() - self.started)
+
+    def plan(self):
+        """يولّد (symbol, lite) بترتيب الأولوية؛ القرار يُتخذ عند الوصول للرمز بالوقت الفعلي المتبقي."""
+        lite_rest = sum(self.cost["lite"].values())
+        for sym in self.order:
+            lite_rest -= self.cost["lite"][sym]
+            yield sym, self.remaining() < self.cost["full"][sym] + lite_rest
+
+    def record(self, sym, lite, seconds):
+        self.timings[(sym, "lite" if lite else "full")] = seconds
+
+    def save(self, chunk=500):
+        rows = []
+        for (sym, mode), secs in self.timings.items():
+            old = self.info.get(sym, {}).get(f"{mode}_seconds")
+            new = secs if not old else (1 - COST_EWMA_ALPHA) * old + COST_EWMA_ALPHA * secs
+            rows.append({"stock_symbol": sym, "mode": mode, "seconds": round(new, 3),
+                         "updated_at": pd.Timestamp.now(tz="UTC").isoformat()})
+        for i in range(0, len(rows), chunk):
+            try:
+                self.sb.table("forecast_symbol_costs").upsert(rows[i:i+chunk], on_conflict="stock_symbol,mode").execute()
+            except Exception as e:
+                print(f"[WARN] save forecast_symbol_costs failed: {e}")
+
+    def summary(self):
+        full = sum(1 for _, m in self.timings if m == "full")
+        lite = len(self.timings) - full
+        return (f"scheduler: full {full}, lite {lite}, "
+                f"{time.monotonic() - self.started:.0f}s used of {self.deadline / (1.0 - DEADLINE_MARGIN):.0f}s deadline")
+
 # ========== التنفيذ الصامت مع نسبة تقدم ==========
-def main():
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Generate D+1 forecasts for tracked symbols.")
+    ap.add_argument("--deadline", default=FORECAST_DEADLINE,
+                    help="wall-clock budget, e.g. 100m or 1h30m: prioritise symbols and use a lighter model for the tail")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    started = time.monotonic()
     try:
+        deadline = parse_duration(parse_args(argv).deadline)
         sb = get_client()
         syms = list_tracked_symbols(sb)
+        # الرموز التي لم يتغيّر سجلها منذ آخر توقع ناجح لا تُعاد
+        todo, fps = fingerprints.filter_changed(sb, "forecast", syms, MODEL_VERSION)
+        unchanged = len(syms) - len(todo)
+        syms = todo
         total = len(syms)
-        print(f"Symbols to process (is_tracked=True): {total}")
+        print(f"Symbols to process (is_tracked=True): {total}" + (f", unchanged: {unchanged}" if unchanged else ""))
         if total == 0:
             print("Done. Symbols predicted: 0, Skipped: 0")
             return
 
-        ok, skipped = 0, 0
-        for i, sym in enumerate(syms, 1):
+        load_feature_sets(sb, syms)
+        sched = DeadlineScheduler(sb, syms, deadline, started) if deadline else None
+        plan = sched.plan() if sched else ((sym, False) for sym in syms)
+        ok, skipped, done = 0, 0, []
+        batch = ForecastBatch(sb)
+        for i, (sym, lite) in enumerate(plan, 1):
+            t0 = time.monotonic()
             try:
-                ok_flag = forecast_one_symbol(sb, sym)
-                if ok_flag:
+                rows = fetch_and_forecast(sb, sym, lite)
+                if rows:
+                    batch.add(rows)
                     ok += 1
                 else:
                     skipped += 1
+                # توقع خفيف لا يُسجَّل كمنجز حتى تعيده إعادة التشغيل بالنموذج الكامل
+                if not lite:
+                    done.append(sym)
             except Exception:
                 skipped += 1
+            if sched:
+                sched.record(sym, lite, time.monotonic() - t0)
             # نسبة التقدم
             pct = int((i / total) * 100)
             sys.stdout.write(f"\rProgress: {pct}%")
             sys.stdout.flush()
 
         print()  # سطر جديد بعد شريط التقدم
-        print(f"Done. Symbols predicted: {ok}, Skipped: {skipped}")
+        evaluated = batch.complete()
+        fingerprints.save(sb, "forecast", fps, [s for s in done if s not in batch.failed])
+        save_feature_sets(sb)
+        save_shadow_forecasts(sb)
+        row_diff.report()
+        report_feature_budget()
+        report_model_updates()
+        report_shadow()
+        if sched:
+            sched.save()
+            print(f"[INFO] {sched.summary()}")
+        print(f"Done. Symbols predicted: {ok}, Skipped: {skipped}" + (f", Evaluated: {evaluated}" if evaluated else ""))
     except Exception as e:
         print("ERROR:", e)
         traceback.print_exc()
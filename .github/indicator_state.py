@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+indicator_state.py
+------------------
+حالة مؤشرات تراكمية (streaming) لكل رمز: كل شمعة يومية جديدة تحدّث جميع المؤشرات
+بزمن ثابت O(1) بدلاً من إعادة حساب السلسلة كاملة.
+
+- EMA/MACD: آخر قيمة EMA وعدد المشاهدات.
+- SMA/Bollinger/ATR/volatility_20/RSI: نافذة متدحرجة مع المجموع ومجموع المربعات.
+- Stochastic/Williams %R: deques رتيبة للحد الأدنى/الأعلى.
+
+القيم تطابق دوال الدفعة في compute_indicators_and_candles_v2 (ضمن هامش عددي صغير)،
+بما في ذلك RSI الذي يستخدم متوسطاً بسيطاً متدحرجاً للمكاسب/الخسائر كما في rsi().
+الحالة قابلة للتسلسل إلى JSON (to_dict/from_dict) لتُحفظ في جدول indicator_state.
+"""
+
+import math
+from collections import deque
+
+NAN = float("nan")
+
+def _isnan(x):
+    return x is None or (isinstance(x, float) and math.isnan(x))
+
+def _enc(x):
+    return None if _isnan(x) else x
+
+def _dec(x):
+    return NAN if x is None else x
+
+# ========== لبنات أساسية ==========
+class RollingWindow:
+    """نافذة بطول n تحفظ المجموع ومجموع المربعات (تطابق rolling(n, min_periods=n))."""
+
+    def __init__(self, n):
+        self.n = int(n)
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nans = 0
+
+    def push(self, x):
+        self.values.append(x)
+        if _isnan(x):
+            self.nans += 1
+        else:
+            self.total += x; self.total_sq += x * x
+        if len(self.values) > self.n:
+            old = self.values.popleft()
+            if _isnan(old):
+                self.nans -= 1
+            else:
+                self.total -= old; self.total_sq -= old * old
+
+    @property
+    def ready(self):
+        return len(self.values) == self.n and self.nans == 0
+
+    def mean(self):
+        return self.total / self.n if self.ready else NAN
+
+    def std(self):
+        if not self.ready or self.n < 2:
+            return NAN
+        var = (self.total_sq - self.total * self.total / self.n) / (self.n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def to_dict(self):
+        return {"n": self.n, "values": [_enc(v) for v in self.values]}
+
+    @classmethod
+    def from_dict(cls, d):
+        w = cls(d["n"])
+        for v in d["values"]:
+            w.push(_dec(v))
+        return w
+
+class EMAState:
+    """مطابق لـ ewm(span=n, adjust=False, min_periods=n).mean()."""
+
+    def __init__(self, n, value=None, count=0):
+        self.n = int(n)
+        self.alpha = 2.0 / (self.n + 1.0)
+        self.value = value
+        self.count = count
+
+    def push(self, x):
+        if not _isnan(x):
+            self.value = x if self.value is None else self.alpha * x + (1.0 - self.alpha) * self.value
+            self.count += 1
+        return self.current()
+
+    def current(self):
+        return self.value if self.count >= self.n else NAN
+
+    def to_dict(self):
+        return {"n": self.n, "value": self.value, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["n"], d["value"], d["count"])
+
+class MinMaxWindow:
+    """حد أدنى وأعلى متدحرج بطول n عبر deques رتيبة."""
+
+    def __init__(self, n):
+        self.n = int(n)
+        self.i = 0
+        self.lows = deque()    # (index, value) بقيم متزايدة
+        self.highs = deque()   # (index, value) بقيم متناقصة
+
+    def push(self, low, high):
+        i = self.i
+        while self.lows and self.lows[-1][1] >= low: self.lows.pop()
+        self.lows.append((i, low))
+        while self.highs and self.highs[-1][1] <= high: self.highs.pop()
+        self.highs.append((i, high))
+        start = i - self.n + 1
+        while self.lows[0][0] < start: self.lows.popleft()
+        while self.highs[0][0] < start: self.highs.popleft()
+        self.i += 1
+
+    @property
+    def ready(self):
+        return self.i >= self.n
+
+    def lowest(self):
+        return self.lows[0][1] if self.ready else NAN
+
+    def highest(self):
+        return self.highs[0][1] if self.ready else NAN
+
+    def to_dict(self):
+        return {"n": self.n, "i": self.i, "lows": [list(p) for p in self.lows], "highs": [list(p) for p in self.highs]}
+
+    @classmethod
+    def from_dict(cls, d):
+        w = cls(d["n"]); w.i = d["i"]
+        w.lows = deque(tuple(p) for p in d["lows"]); w.highs = deque(tuple(p) for p in d["highs"])
+        return w
+
+# ========== إعداد المؤشرات من indicator_definitions ==========
+def config_from_defs(defs):
+    """نفس منطق compute_technical_set في اختيار المؤشرات والفترات."""
+    cfg = {}
+    for d in defs:
+        if d.get("type") != "technical": continue
+        name = d["name"]; period = d.get("period")
+        if name == "RSI": cfg["rsi"] = int(period or 14)
+        elif name == "EMA12": cfg["ema12"] = int(period or 12)
+        elif name == "EMA26": cfg["ema26"] = int(period or 26)
+        elif name == "SMA20": cfg["sma20"] = int(period or 20)
+        elif name == "SMA50": cfg["sma50"] = int(period or 50)
+        elif name == "SMA200": cfg["sma200"] = int(period or 200)
+        elif name == "MACD": cfg["macd"] = True
+        elif name == "MACD_signal": cfg["macd"] = cfg["macd_signal"] = True
+        elif name == "MACD_histogram": cfg["macd"] = cfg["macd_signal"] = cfg["macd_histogram"] = True
+        elif name in ["Bollinger_upper","Bollinger_middle","Bollinger_lower"]: cfg["boll"] = int(period or 20)
+        elif name == "Stochastic_K": cfg["stoch"] = [int(period or 14), 3]
+        elif name == "Stochastic_D":
+            if "stoch" not in cfg: cfg["stoch"] = [14, int(period or 3)]
+        elif name == "Williams_%R": cfg["williams_r"] = int(period or 14)
+    return cfg
+
+# ========== حالة رمز واحد ==========
+class SymbolIndicatorState:
+    def __init__(self, config):
+        self.config = dict(config)
+        c = self.config
+        self.last_date = None
+        self.prev_bar = None       # آخر شمعة (لاستخدامها في detect_candles وTR وpct_change)
+        self.prev_hist = NAN       # آخر macd - macd_signal (لـ macd_cross)
+        self.sma = {k: RollingWindow(c[k]) for k in ("sma20","sma50","sma200") if k in c}
+        self.ema = {k: EMAState(c[k]) for k in ("ema12","ema26") if k in c}
+        self.macd_fast = EMAState(12) if c.get("macd") else None
+        self.macd_slow = EMAState(26) if c.get("macd") else None
+        self.macd_sig = EMAState(9) if c.get("macd_signal") else None
+        self.boll = RollingWindow(c["boll"]) if "boll" in c else None
+        self.rsi_gain = RollingWindow(c["rsi"]) if "rsi" in c else None
+        self.rsi_loss = RollingWindow(c["rsi"]) if "rsi" in c else None
+        self.stoch = MinMaxWindow(c["stoch"][0]) if "stoch" in c else None
+        self.stoch_d = RollingWindow(c["stoch"][1]) if "stoch" in c else None
+        self.will = MinMaxWindow(c["williams_r"]) if "williams_r" in c else None
+        self.vol20 = RollingWindow(20)
+        self.atr14 = RollingWindow(14)
+
+    def update(self, bar):
+        """يضيف شمعة {date, open, high, low, close} ويعيد قيم technical_indicators غير الفارغة."""
+        c = self.config
+        close = float(bar["close"]); high = float(bar["high"]); low = float(bar["low"])
+        prev_close = float(self.prev_bar["close"]) if self.prev_bar else NAN
+        out = {}
+
+        for k, w in self.sma.items():
+            w.push(close); out[k] = w.mean()
+        for k, e in self.ema.items():
+            out[k] = e.push(close)
+
+        if self.macd_fast is not None:
+            macd = self.macd_fast.push(close) - self.macd_slow.push(close)
+            out["macd"] = macd
+            if self.macd_sig is not None:
+                sig = self.macd_sig.push(macd)
+                out["macd_signal"] = sig
+                if c.get("macd_histogram"): out["macd_histogram"] = macd - sig
+                hist = macd - sig
+                diff = hist - self.prev_hist
+                out["macd_cross"] = 0 if _isnan(diff) else int((diff > 0) - (diff < 0))
+                self.prev_hist = hist
+
+        if self.boll is not None:
+            self.boll.push(close)
+            mid = self.boll.mean(); sd = self.boll.std()
+            out["boll_upper"], out["boll_middle"], out["boll_lower"] = mid + 2*sd, mid, mid - 2*sd
+
+        if self.rsi_gain is not None:
+            delta = close - prev_close
+            self.rsi_gain.push(NAN if _isnan(delta) else max(delta, 0.0))
+            self.rsi_loss.push(NAN if _isnan(delta) else max(-delta, 0.0))
+            gain, loss = self.rsi_gain.mean(), self.rsi_loss.mean()
+            rsi = NAN if (_isnan(loss) or loss == 0) else 100 - (100 / (1 + gain / loss))
+            out["rsi"] = rsi
+            out["rsi_zone"] = 0 if rsi < 30 else (2 if rsi > 70 else 1)
+
+        if self.stoch is not None:
+            self.stoch.push(low, high)
+            lo, hi = self.stoch.lowest(), self.stoch.highest()
+            denom = hi - lo
+            k = NAN if (_isnan(denom) or denom == 0) else (close - lo) * 100 / denom
+            self.stoch_d.push(k)
+            out["stochastic_k"], out["stochastic_d"] = k, self.stoch_d.mean()
+
+        if self.will is not None:
+            self.will.push(low, high)
+            lo, hi = self.will.lowest(), self.will.highest()
+            denom = hi - lo
+            out["williams_r"] = NAN if (_isnan(denom) or denom == 0) else -100 * (hi - close) / denom
+
+        self.vol20.push(close / prev_close - 1.0 if not _isnan(prev_close) and prev_close != 0 else NAN)
+        out["volatility_20"] = self.vol20.std()
+        tr = high - low if _isnan(prev_close) else max(abs(high - low), abs(high - prev_close), abs(low - prev_close))
+        self.atr14.push(abs(tr))
+        out["atr14"] = self.atr14.mean()
+
+        self.prev_bar = {k: bar[k] for k in ("date","open","high","low","close")}
+        self.last_date = str(bar["date"])
+        return {k: v for k, v in out.items() if not _isnan(v) and math.isfinite(v)}
+
+    # ----- تسلسل -----
+    def to_dict(self):
+        return {
+            "config": self.config,
+            "last_date": self.last_date,
+            "prev_bar": self.prev_bar,
+            "prev_hist": _enc(self.prev_hist),
+            "sma": {k: w.to_dict() for k, w in self.sma.items()},
+            "ema": {k: e.to_dict() for k, e in self.ema.items()},
+            "macd_fast": self.macd_fast.to_dict() if self.macd_fast else None,
+            "macd_slow": self.macd_slow.to_dict() if self.macd_slow else None,
+            "macd_sig": self.macd_sig.to_dict() if self.macd_sig else None,
+            "boll": self.boll.to_dict() if self.boll else None,
+            "rsi_gain": self.rsi_gain.to_dict() if self.rsi_gain else None,
+            "rsi_loss": self.rsi_loss.to_dict() if self.rsi_loss else None,
+            "stoch": self.stoch.to_dict() if self.stoch else None,
+            "stoch_d": self.stoch_d.to_dict() if self.stoch_d else None,
+            "will": self.will.to_dict() if self.will else None,
+            "vol20": self.vol20.to_dict(),
+            "atr14": self.atr14.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        st = cls(d["config"])
+        st.last_date = d.get("last_date"); st.prev_bar = d.get("prev_bar")
+        st.prev_hist = _dec(d.get("prev_hist"))
+        st.sma = {k: RollingWindow.from_dict(v) for k, v in d["sma"].items()}
+        st.ema = {k: EMAState.from_dict(v) for k, v in d["ema"].items()}
+        for name, kind in (("macd_fast", EMAState), ("macd_slow", EMAState), ("macd_sig", EMAState),
+                           ("boll", RollingWindow), ("rsi_gain", RollingWindow), ("rsi_loss", RollingWindow),
+                           ("stoch", MinMaxWindow), ("stoch_d", RollingWindow), ("will", MinMaxWindow),
+                           ("vol20", RollingWindow), ("atr14", RollingWindow)):
+            setattr(st, name, kind.from_dict(d[name]) if d.get(name) else None)
+        return st
+
+def replay(config, hist):
+    """يبني الحالة من سجل كامل (DataFrame مرتب) ويعيد (state, [(date, values), ...])."""
+    st = SymbolIndicatorState(config)
+    rows = []
+    for bar in hist[["date","open","high","low","close"]].to_dict("records"):
+        rows.append((bar["date"], st.update(bar)))
+    return st, rows
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+intraday_refresh.py
+-------------------
+تحديث أسعار stocks أثناء جلسة التداول بدل الانتظار حتى update_prices_only بعد الإغلاق.
+
+- كل INTRADAY_INTERVAL_MIN دقيقة (أثناء 09:30-16:00 بتوقيت نيويورك، الإثنين-الجمعة)
+  تُجلب أسعار كل الرموز المتتبَّعة من Yahoo على دفعات (INTRADAY_BATCH رمز لكل طلب).
+- الطلبات تعمل بـ asyncio بتوازي محدود (INTRADAY_CONCURRENCY) وضمن ميزانية ثابتة
+  INTRADAY_REQUESTS_PER_MIN طلب في الدقيقة (token bucket).
+- كل محاولة (بما فيها إعادة المحاولة بعد 429/503 أو خطأ شبكة) تأخذ رمزاً من الميزانية،
+  والانتظار بين المحاولات غير حاجب (asyncio.sleep).
+- آخر قيم مكتوبة تُحفظ في الذاكرة (تبدأ من محتوى stocks)، ولا يُكتب إلا الرموز التي
+  تغيّر سعرها أو حجمها أو قيمتها السوقية، في upsert جماعي واحد لكل دورة.
+
+أمثلة:
+    python intraday_refresh.py                 # daemon: يعمل باستمرار وينام خارج الجلسة
+    python intraday_refresh.py --until-close   # ينتظر الافتتاح إن بدأ قبله، وينتهي بعد الإغلاق (مناسب لـ workflow)
+    python intraday_refresh.py --once --ignore-hours
+"""
+
+import os, sys, time, asyncio, argparse, traceback
+from urllib import error
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from pipeline_core import get_client, load_symbols, yahoo_symbol, PAGE
+from update_nasdaq_snapshot import fetch_json, parse_number
+from update_prices_only import upsert_stocks, to_utc_iso_floor_minute
+
+INTRADAY_INTERVAL_MIN = float(os.getenv("INTRADAY_INTERVAL_MIN", "5"))
+INTRADAY_BATCH = int(os.getenv("INTRADAY_BATCH", "50"))
+INTRADAY_CONCURRENCY = int(os.getenv("INTRADAY_CONCURRENCY", "4"))
+INTRADAY_REQUESTS_PER_MIN = int(os.getenv("INTRADAY_REQUESTS_PER_MIN", "60"))
+INTRADAY_RETRIES = int(os.getenv("INTRADAY_RETRIES", "2"))
+INTRADAY_BACKOFF = 1.5
+
+YAHOO_BATCH_QUOTE_ENDPOINT = "https://query1.finance.yahoo.com/v7/finance/quote?symbols={symbols}"
+NY = ZoneInfo("America/New_York")
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+
+def log(message: str):
+    print(f"[intraday] {message}")
+
+# ========== جلسة التداول ==========
+def session_bounds(now):
+    ny = now.astimezone(NY)
+    open_ = ny.replace(hour=MARKET_OPEN[0], minute=MARKET_OPEN[1], second=0, microsecond=0)
+    close = ny.replace(hour=MARKET_CLOSE[0], minute=MARKET_CLOSE[1], second=0, microsecond=0)
+    return open_, close
+
+def market_open(now=None):
+    now = now or datetime.now(timezone.utc)
+    if now.astimezone(NY).weekday() >= 5:
+        return False
+    open_, close = session_bounds(now)
+    return open_ <= now < close
+
+def before_open_today(now=None):
+    """يوم تداول لم تبدأ جلسته بعد."""
+    now = now or datetime.now(timezone.utc)
+    open_, _ = session_bounds(now)
+    return open_.weekday() < 5 and now < open_
+
+def seconds_until_open(now=None):
+    now = now or datetime.now(timezone.utc)
+    open_, _ = session_bounds(now)
+    if now >= open_:
+        open_ += timedelta(days=1)
+    while open_.weekday() >= 5:
+        open_ += timedelta(days=1)
+    return max(0.0, (open_ - now).total_seconds())
+
+# ========== ميزانية الطلبات ==========
+class RequestBudget:
+    """token bucket: سعة per_minute ويمتلئ بمعدل per_minute/60 في الثانية."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# ========== الجلب ==========
+def quote_row(sym, name, q):
+    ts = q.get("regularMarketTime")
+    last = datetime.fromtimestamp(ts, timezone.utc) if ts else datetime.now(timezone.utc)
+    volume = parse_number(q.get("regularMarketVolume"))
+    mcap = parse_number(q.get("marketCap"))
+    return {
+        "symbol": sym,
+        "name": name or sym,
+        "price": parse_number(q.get("regularMarketPrice")),
+        "change": parse_number(q.get("regularMarketChange")),
+        "change_percent": parse_number(q.get("regularMarketChangePercent")),
+        "volume": int(volume) if volume is not None else None,
+        "market_cap": int(mcap) if mcap is not None else None,
+        "last_updated": to_utc_iso_floor_minute(last),
+    }
+
+def _retryable(exc):
+    if isinstance(exc, error.HTTPError):
+        return getattr(exc, "code", None) in (429, 503)
+    return isinstance(exc, error.URLError)
+
+async def fetch_batch(syms, names, budget, sem):
+    ymap = {yahoo_symbol(s): s for s in syms}
+    url = YAHOO_BATCH_QUOTE_ENDPOINT.format(symbols="%2C".join(ymap))
+    attempt = 0
+    while True:
+        # إعادة المحاولة هنا لا داخل fetch_json: كل محاولة تُحسب على الميزانية ولا تحجز خيطاً أثناء الانتظار
+        async with sem:
+            await budget.acquire()
+            try:
+                data = await asyncio.to_thread(fetch_json, url, max_retries=0)
+                break
+            except Exception as e:
+                if not _retryable(e) or attempt >= INTRADAY_RETRIES:
+                    print(f"[WARN] quote batch failed ({len(syms)} symbols, first {syms[0]}): {e}")
+                    return []
+                delay = INTRADAY_BACKOFF ** attempt
+                log(f"quote batch error ({e}); retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+    rows = []
+    for q in (data.get("quoteResponse", {}).get("result") or []):
+        sym = ymap.get(q.get("symbol"))
+        if sym and q.get("regularMarketPrice") is not None:
+            rows.append(quote_row(sym, names.get(sym), q))
+    return rows
+
+# ========== الحالة وكشف التغيّر ==========
+def _key(row):
+    price = row.get("price")
+    return (round(price, 4) if price is not None else None, row.get("volume"), row.get("market_cap"))
+
+class Refresher:
+    def __init__(self, sb):
+        self.sb = sb
+        self.symbols, self.names, self.last = [], {}, {}
+        self.loaded_for = None
+        self.budget = None  # يبقى بين الدورات حتى لا تتجاوز الدورات المتتالية الميزانية
+
+    def load(self):
+        """الرموز المتتبَّعة + آخر قيم مخزّنة في stocks (مرة لكل يوم تداول)."""
+        self.symbols = load_symbols()
+        self.names, self.last = {}, {}
+        if self.sb is None:
+            return
+        wanted = set(self.symbols)
+        start = 0
+        try:
+            while True:
+                res = (self.sb.table("stocks").select("symbol,name,price,volume,market_cap")
+                         .order("symbol").range(start, start + PAGE - 1).execute())
+                data = res.data or []
+                for r in data:
+                    if r.get("symbol") in wanted:
+                        self.names[r["symbol"]] = r.get("name")
+                        self.last[r["symbol"]] = _key(r)
+                if len(data) < PAGE:
+                    break
+                start += PAGE
+        except Exception as e:
+            print(f"[WARN] load stocks snapshot failed: {e}")
+
+    def changed(self, rows):
+        return [r for r in rows if self.last.get(r["symbol"]) != _key(r)]
+
+    async def cycle(self):
+        today = datetime.now(NY).date()
+        if self.loaded_for != today:
+            self.load()
+            self.loaded_for = today
+        if not self.symbols:
+            log("no tracked symbols")
+            return 0, 0
+        batches = [self.symbols[i:i+INTRADAY_BATCH] for i in range(0, len(self.symbols), INTRADAY_BATCH)]
+        need_min = len(batches) / max(1, INTRADAY_REQUESTS_PER_MIN)
+        if need_min > INTRADAY_INTERVAL_MIN:
+            print(f"[WARN] {len(batches)} requests need {need_min:.1f} min at the current budget; "
+                  f"cycles will run back to back")
+        if self.budget is None:
+            self.budget = RequestBudget(INTRADAY_REQUESTS_PER_MIN)
+        sem = asyncio.Semaphore(max(1, INTRADAY_CONCURRENCY))
+        results = await asyncio.gather(*(fetch_batch(b, self.names, self.budget, sem) for b in batches))
+        rows = [r for batch in results for r in batch]
+        delta = self.changed(rows)
+        if delta:
+            await asyncio.to_thread(upsert_stocks, delta)
+            for r in delta:
+                self.last[r["symbol"]] = _key(r)
+        return len(rows), len(delta)
+
+# ========== الحلقة ==========
+async def run(once=False, until_close=False, ignore_hours=False):
+    refresher = Refresher(get_client())
+    interval = INTRADAY_INTERVAL_MIN * 60
+    ran = False
+    while True:
+        now = datetime.now(timezone.utc)
+        if ignore_hours or market_open(now):
+            ran = True
+            t0 = time.monotonic()
+            try:
+                quoted, written = await refresher.cycle()
+                log(f"quoted {quoted}, changed {written}, took {time.monotonic() - t0:.1f}s")
+            except Exception as e:
+                print(f"[WARN] intraday cycle failed: {e}")
+                traceback.print_exc()
+            if once:
+                return
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - t0)))
+        else:
+            # --until-close: workflow يبدأ قبل الافتتاح فينتظره، ولا ينتهي إلا بعد جلسة كاملة
+            if once or (until_close and (ran or not before_open_today(now))):
+                log("market closed")
+                return
+            wait = seconds_until_open(now)
+            log(f"market closed; sleeping {wait / 3600:.1f}h until the next session")
+            await asyncio.sleep(wait)
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Refresh stocks prices during market hours (delta-only writes).")
+    ap.add_argument("--once", action="store_true", help="run a single refresh cycle and exit")
+    ap.add_argument("--until-close", action="store_true", help="exit when the session closes instead of sleeping")
+    ap.add_argument("--ignore-hours", action="store_true", help="refresh even outside market hours")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    log(f"interval {INTRADAY_INTERVAL_MIN:g} min, batch {INTRADAY_BATCH}, "
+        f"concurrency {INTRADAY_CONCURRENCY}, budget {INTRADAY_REQUESTS_PER_MIN}/min")
+    asyncio.run(run(args.once, args.until_close, args.ignore_hours))
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        log("stopped")
+    except Exception as exc:
+        log(f"Failed: {exc}")
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+pg_bulk.py
+----------
+مسار كتابة مباشر إلى Postgres (اختياري) للتحميل الكبير بدلاً من upsert JSON عبر PostgREST.
+
+- يُفعَّل فقط عند ضبط DATABASE_URL (سلسلة اتصال Postgres الخاصة بمشروع Supabase).
+- الصفوف تُبثّ بـ COPY إلى جدول مؤقت ثم تُدمج بـ INSERT ... ON CONFLICT على نفس
+  مفاتيح التعارض التي تستخدمها السكربتات (مثلاً stock_symbol,date).
+- psycopg2 يُستورد عند أول استخدام فقط، فلا يلزم تثبيته ما لم يُضبط DATABASE_URL.
+
+مثال:
+    import pg_bulk
+    if pg_bulk.enabled():
+        pg_bulk.copy_upsert("historical_data", rows, ["stock_symbol", "date"])
+"""
+
+import os, io, csv, json
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+_conn = None
+
+def enabled():
+    return bool(DATABASE_URL)
+
+def get_connection():
+    """اتصال واحد كسول يُعاد استخدامه طوال العملية."""
+    global _conn
+    if _conn is None or _conn.closed:
+        import psycopg2
+        _conn = psycopg2.connect(DATABASE_URL)
+    return _conn
+
+def close():
+    global _conn
+    if _conn is not None and not _conn.closed:
+        _conn.close()
+    _conn = None
+
+def _dedupe(rows, keys):
+    # ON CONFLICT لا يقبل تعديل نفس الصف مرتين في أمر واحد؛ نُبقي آخر نسخة
+    seen = {}
+    for r in rows:
+        seen[tuple(r.get(k) for k in keys)] = r
+    return list(seen.values())
+
+NULL = r"\N"  # علامة NULL في COPY، فيبقى النص الفارغ "" نصاً فارغاً
+
+def _csv_value(v):
+    # dict/list لأعمدة json/jsonb: JSON لا repr بايثون
+    if v is None:
+        return NULL
+    if isinstance(v, (dict, list)):
+        return json.dumps(v)
+    return v
+
+def _csv_buffer(rows, columns):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for r in rows:
+        w.writerow([_csv_value(r.get(c)) for c in columns])
+    buf.seek(0)
+    return buf
+
+def copy_upsert(table, rows, conflict_cols, columns=None, update=True):
+    """
+    يكتب rows (قائمة dicts) إلى public.<table> عبر COPY + INSERT ... ON CONFLICT.
+    الأعمدة = اتحاد مفاتيح الصفوف ما لم تُمرَّر columns؛ المفاتيح الغائبة تُكتب NULL.
+    يعيد عدد الصفوف المدمجة.
+    """
+    if not rows:
+        return 0
+    from psycopg2 import sql
+
+    if columns is None:
+        columns = list(dict.fromkeys(k for r in rows for k in r))
+    rows = _dedupe(rows, conflict_cols)
+    tmp = f"_bulk_{table.lower()}"
+    cols = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    keys = sql.SQL(", ").join(sql.Identifier(c) for c in conflict_cols)
+    non_keys = [c for c in columns if c not in conflict_cols]
+    if update and non_keys:
+        action = sql.SQL("DO UPDATE SET ") + sql.SQL(", ").join(
+            sql.SQL("{c} = EXCLUDED.{c}").format(c=sql.Identifier(c)) for c in non_keys)
+    else:
+        action = sql.SQL("DO NOTHING")
+
+    conn = get_connection()
+    with conn:
+        with conn.cursor() as cur:
+            # نسخة من أنواع الأعمدة فقط (بدون قيود NOT NULL أو id)
+            cur.execute(sql.SQL("CREATE TEMP TABLE {tmp} ON COMMIT DROP AS SELECT {cols} FROM public.{t} WITH NO DATA").format(
+                tmp=sql.Identifier(tmp), cols=cols, t=sql.Identifier(table)))
+            cur.copy_expert(sql.SQL("COPY {tmp} ({cols}) FROM STDIN WITH (FORMAT csv, NULL {null})").format(
+                tmp=sql.Identifier(tmp), cols=cols, null=sql.Literal(NULL)).as_string(conn), _csv_buffer(rows, columns))
+            cur.execute(sql.SQL("INSERT INTO public.{t} ({cols}) SELECT {cols} FROM {tmp} ON CONFLICT ({keys}) ").format(
+                t=sql.Identifier(table), cols=cols, tmp=sql.Identifier(tmp), keys=keys) + action)
+            return cur.rowcount
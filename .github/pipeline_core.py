@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline_core.py
+----------------
+الأجزاء المشتركة بين سكربتات .github بدلاً من نسخها في كل سكربت:
+
+- get_client(): عميل Supabase واحد يُنشأ عند أول استخدام (لا عند الاستيراد) ويُعاد
+  استخدامه في كل العملية، فتُعاد استخدام جلسة HTTP واتصالاتها بدل فتح عميل لكل سكربت.
+- load_symbols(): جلب الرموز من stocks على صفحات (PAGE) فلا يقطعها حد الـ 1000 صف
+  الافتراضي لـ PostgREST، مع تطبيق SYMBOLS_FILTER.
+- yahoo_symbol() و SYMBOLS_FILTER في مكان واحد.
+- lazy_import(): استيراد كسول للمكتبات الثقيلة (pandas/numpy/yfinance...)؛ الوحدة
+  تُحمَّل فعلياً عند أول وصول لخاصية منها، فيبدأ التشغيل الفارغ أو الـ worker فوراً
+  ويمكن استيراد السكربتات بدون شبكة.
+
+مثال:
+    from pipeline_core import get_client, load_symbols, lazy_import
+    pd = lazy_import("pandas")
+    sb = get_client()            # None عند غياب متغيرات البيئة
+    syms = load_symbols()        # is_tracked=True فقط افتراضياً
+"""
+
+import os, sys, threading, importlib.util
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+PAGE = 1000  # حد الصفوف الافتراضي لـ PostgREST
+SYMBOLS_FILTER = [s.strip().upper() for s in os.getenv("SYMBOLS_FILTER","").split(",") if s.strip()]
+
+_client = None
+_client_ready = False
+_client_lock = threading.Lock()
+
+def lazy_import(name):
+    """يعيد الوحدة name بدون تنفيذها؛ التنفيذ يحدث عند أول وصول لخاصية منها."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def get_client():
+    """عميل Supabase المشترك (أو None مع تحذير إذا غابت متغيرات البيئة أو فشل الاتصال)."""
+    global _client, _client_ready
+    if _client_ready:
+        return _client
+    with _client_lock:
+        if _client_ready:
+            return _client
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_ROLE") or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            print("[WARN] Missing Supabase env vars.")
+        else:
+            try:
+                from supabase import create_client
+                _client = create_client(url, key)
+            except Exception as e:
+                print(f"[WARN] Cannot connect Supabase: {e}")
+        _client_ready = True
+    return _client
+
+def yahoo_symbol(sym: str) -> str:
+    """Yahoo uses '-' instead of '.' for share classes (e.g., BRK.B -> BRK-B)."""
+    return sym.replace(".", "-")
+
+def fetch_symbols(sb, tracked_only=True):
+    """كل الرموز من stocks على صفحات متتالية (يرفع الاستثناء للمستدعي)."""
+    symbols, start = [], 0
+    while True:
+        q = sb.table("stocks").select("symbol")
+        if tracked_only:
+            q = q.eq("is_tracked", True)
+        res = q.order("symbol").range(start, start + PAGE - 1).execute()
+        rows = res.data or []
+        symbols.extend(r["symbol"] for r in rows if r.get("symbol"))
+        if len(rows) < PAGE:
+            break
+        start += PAGE
+    return symbols
+
+def load_symbols(tracked_only=True):
+    """الرموز بعد SYMBOLS_FILTER؛ عند غياب العميل أو الفشل يُعاد SYMBOLS_FILTER."""
+    sb = get_client()
+    if sb is None:
+        return SYMBOLS_FILTER
+    try:
+        syms = fetch_symbols(sb, tracked_only)
+        if SYMBOLS_FILTER:
+            syms = [s for s in syms if s in SYMBOLS_FILTER]
+        return syms
+    except Exception as e:
+        print(f"[WARN] load_symbols failed: {e}")
+        return SYMBOLS_FILTER
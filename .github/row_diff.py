@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+row_diff.py
+-----------
+وضع كتابة تفاضلي (DIFF_UPSERTS=1): كل صف صادر يُختزل إلى hash ويُقارن بالـ hash المخزّن
+لنفس (table, stock_symbol, date) في جدول row_hashes (migration_178)؛ تُرسل فقط الصفوف
+الجديدة أو المتغيّرة، فيقلّ WAL وتحديث الفهارس، ولا يُطلق تحديث forecasts المتطابق
+trigger التقييم من جديد.
+
+الاستخدام داخل دوال upsert:
+    rows = row_diff.filter_changed(sb, "historical_data", rows)
+    ... الكتابة ...
+    row_diff.mark_written(sb, "historical_data", rows)   # بعد نجاح الكتابة فقط
+    row_diff.report()                                    # ملخص written/skipped في النهاية
+"""
+
+import os, json, hashlib
+
+DIFF_UPSERTS = os.getenv("DIFF_UPSERTS", "0") == "1"
+PAGE = 1000  # حد الصفوف الافتراضي لـ PostgREST
+CHUNK = 500
+
+# مفتاح التاريخ لكل جدول مدعوم
+DATE_KEYS = {
+    "historical_data": "date",
+    "technical_indicators": "date",
+    "forecasts": "forecast_date",
+}
+
+# أعمدة double precision؛ بقية الأعمدة العشرية في هذه الجداول real
+DOUBLE_COLUMNS = {
+    "technical_indicators": {"volatility_20", "atr14"},
+}
+
+# table -> [written, skipped]
+STATS = {}
+
+def _norm(v, double=False):
+    # real: 7 أرقام معنوية (ما تخزّنه القاعدة) تُسقط ضجيج الفاصلة العائمة؛ double: القيمة كاملة
+    if isinstance(v, float):
+        return repr(v) if double else f"{v:.7g}"
+    return v
+
+def row_hash(table, row):
+    date_key = DATE_KEYS[table]
+    doubles = DOUBLE_COLUMNS.get(table, ())
+    payload = {k: _norm(v, k in doubles) for k, v in row.items() if k not in ("stock_symbol", date_key) and v is not None}
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+def _key(table, row):
+    return (row["stock_symbol"], str(row[DATE_KEYS[table]]))
+
+def load_hashes(sb, table, rows):
+    """{(symbol, date): hash} للرموز والمدى الزمني الذي تغطيه rows."""
+    date_key = DATE_KEYS[table]
+    syms = sorted({r["stock_symbol"] for r in rows})
+    dates = [str(r[date_key]) for r in rows]
+    lo, hi = min(dates), max(dates)
+    out = {}
+    for i in range(0, len(syms), CHUNK):
+        start = 0
+        while True:
+            res = (sb.table("row_hashes").select("stock_symbol,date,row_hash")
+                     .eq("table_name", table).in_("stock_symbol", syms[i:i+CHUNK])
+                     .gte("date", lo).lte("date", hi)
+                     .range(start, start + PAGE - 1).execute())
+            data = res.data or []
+            for r in data:
+                out[(r["stock_symbol"], str(r["date"]))] = r["row_hash"]
+            if len(data) < PAGE:
+                break
+            start += PAGE
+    return out
+
+def filter_changed(sb, table, rows):
+    """يعيد الصفوف الجديدة أو المتغيّرة فقط (أو rows كما هي إذا كان الوضع معطّلاً)."""
+    if not DIFF_UPSERTS or sb is None or not rows:
+        return rows
+    try:
+        stored = load_hashes(sb, table, rows)
+    except Exception as e:
+        print(f"[WARN] row_hashes unavailable for {table}: {e}")
+        return rows
+    changed = [r for r in rows if stored.get(_key(table, r)) != row_hash(table, r)]
+    STATS.setdefault(table, [0, 0])[1] += len(rows) - len(changed)
+    return changed
+
+def mark_written(sb, table, rows):
+    """يخزّن hash الصفوف التي كُتبت بنجاح."""
+    if not DIFF_UPSERTS or sb is None or not rows:
+        return
+    STATS.setdefault(table, [0, 0])[0] += len(rows)
+    seen = {}
+    for r in rows:
+        sym, d = _key(table, r)
+        seen[(sym, d)] = {"table_name": table, "stock_symbol": sym, "date": d, "row_hash": row_hash(table, r)}
+    payload = list(seen.values())
+    for i in range(0, len(payload), CHUNK):
+        try:
+            sb.table("row_hashes").upsert(payload[i:i+CHUNK], on_conflict="table_name,stock_symbol,date").execute()
+        except Exception as e:
+            print(f"[WARN] save row_hashes failed for {table}: {e}")
+
+def report():
+    for table, (written, skipped) in sorted(STATS.items()):
+        print(f"[INFO] diff upsert {table}: written {written}, skipped unchanged {skipped}")
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+run_pipeline.py
+---------------
+يشغّل مراحل الخط الليلي في عملية واحدة بدلاً من أربعة workflows منفصلة:
+
+    prices -> history -> indicators -> forecast
+
+- كل مرحلة تسلّم مخرجاتها (DataFrames) للمرحلة التالية في الذاكرة، فلا تُعاد
+  قراءة ما كُتب للتو من Supabase.
+- الكتابة إلى Supabase تتم دفعة واحدة (على شكل chunks) عند حدود كل مرحلة.
+- إذا بدأ التشغيل من مرحلة متأخرة تُحمَّل مدخلاتها من Supabase كالمعتاد.
+
+أمثلة:
+    python run_pipeline.py                        # كل المراحل
+    python run_pipeline.py --from indicators      # indicators ثم forecast
+    python run_pipeline.py --only history,forecast
+    python run_pipeline.py --deadline 160m        # الجدولة بمهلة في مرحلة forecast
+"""
+
+import sys, time, argparse, traceback
+from tqdm import tqdm
+
+import update_prices_only as prices_mod
+import sync_historical_90d as history_mod
+import compute_indicators_and_candles_v2 as indicators_mod
+import forecast_generate_tracked_symbols_v6i_1day_silent as forecast_mod
+import pg_bulk
+import fingerprints
+import row_diff
+import indicator_state
+from pipeline_core import get_client, lazy_import
+
+pd = lazy_import("pandas")
+
+CHUNK = 1000      # حجم دفعة الـ upsert عبر PostgREST عند حدود المراحل
+PG_CHUNK = 50000  # حجم الدفعة عند الكتابة المباشرة بـ COPY (DATABASE_URL)
+
+# كل مرحلة -> المراحل التي تعتمد عليها (ترتيب القائمة هو ترتيب التنفيذ)
+STAGES = ["prices", "history", "indicators", "forecast"]
+DEPENDS = {
+    "prices": [],
+    "history": ["prices"],
+    "indicators": ["history"],
+    "forecast": ["indicators"],
+}
+
+def log(message: str):
+    print(f"[pipeline] {message}")
+
+def write_chunks(write, rows, chunk=None):
+    """يكتب rows على دفعات؛ يعيد رموز الدفعات التي أعاد write لها False (فشل الكتابة)."""
+    chunk = chunk or (PG_CHUNK if pg_bulk.enabled() else CHUNK)
+    failed = set()
+    for i in range(0, len(rows), chunk):
+        part = rows[i:i+chunk]
+        if write(part) is False:
+            failed.update(r["stock_symbol"] for r in part)
+    return failed
+
+# ========== المراحل ==========
+def stage_prices(ctx):
+    symbols = prices_mod.load_symbols()
+    existing_names = prices_mod.load_existing_names(symbols)
+    rows = []
+    for sym in tqdm(symbols, desc="Prices", unit="sym"):
+        rows.append(prices_mod.build_stock_row(sym, existing_names.get(sym)))
+        time.sleep(0.05)
+    prices_mod.upsert_stocks(rows)
+    ctx["symbols"] = [r["symbol"] for r in rows if r.get("is_tracked")]
+    log(f"prices: {len(rows)} stocks upserted, {len(ctx['symbols'])} tracked")
+
+def stage_history(ctx):
+    symbols = ctx.get("symbols") or history_mod.load_symbols()
+    fresh_rows, history, rebuilt = [], {}, {}
+    for sym in tqdm(symbols, desc="Historical 90d", unit="sym"):
+        stored = indicators_mod.fetch_history(sym)
+        try:
+            if history_mod.HISTORY_INCREMENTAL:
+                closes = {} if stored.empty else dict(zip(stored["date"].astype(str), stored["close"]))
+                rows, reason = history_mod.fetch_symbol_update(sym, closes)
+                if reason:
+                    rebuilt[sym] = reason
+            else:
+                rows = history_mod.fetch_symbol_rows(sym)
+        except Exception as e:
+            print(f"[WARN] sync_symbol failed for {sym}: {e}")
+            rows = []
+        fresh_rows.extend(rows)
+        # السجل الكامل = المخزّن سابقاً + النافذة الجديدة (الجديد يطغى على القديم)
+        merged = pd.concat([stored, pd.DataFrame(rows)], ignore_index=True)
+        if merged.empty:
+            continue
+        merged = merged.drop(columns=["stock_symbol"], errors="ignore")
+        merged = merged.drop_duplicates("date", keep="last")
+        history[sym] = indicators_mod.clean_history(merged)
+        time.sleep(0.05)
+    write_chunks(history_mod.upsert_rows, fresh_rows)
+    n = len(fresh_rows)
+    history_mod.reset_indicator_state(rebuilt)
+    ctx["symbols"], ctx["history"] = symbols, history
+    log(f"history: {n} rows upserted for {len(symbols)} symbols"
+        + (f", full rebuild for {len(rebuilt)}: {', '.join(sorted(rebuilt))}" if rebuilt else ""))
+
+def stage_indicators(ctx):
+    defs = indicators_mod.fetch_indicator_defs()
+    history = ctx.get("history")
+    symbols = ctx.get("symbols") or indicators_mod.load_symbols()
+    extra = fingerprints.config_digest(indicator_state.config_from_defs(defs))
+    todo, fps = fingerprints.filter_changed(get_client(), "indicators", symbols, extra)
+    if history is None:
+        history = {}
+        for sym in tqdm(todo, desc="Load history", unit="sym"):
+            hist = indicators_mod.fetch_history(sym)
+            if not hist.empty:
+                history[sym] = indicators_mod.clean_history(hist)
+    rows_t, rows_c, indicators, candles = [], [], {}, {}
+    for sym in tqdm([s for s in todo if s in history], desc="Indicators/Candles", unit="sym"):
+        hist = history[sym]
+        try:
+            tech, sym_t, sym_c = indicators_mod.compute_symbol(sym, hist, defs)
+        except Exception as e:
+            print(f"[WARN] compute failed for {sym}: {e}"); traceback.print_exc()
+            continue
+        rows_t.extend(sym_t); rows_c.extend(sym_c)
+        indicators[sym] = tech.assign(date=hist.loc[tech.index, "date"])
+        candles[sym] = pd.DataFrame(sym_c)
+    failed = write_chunks(indicators_mod.upsert_indicators, rows_t) | write_chunks(indicators_mod.upsert_candles, rows_c)
+    nt, nc = len(rows_t), len(rows_c)
+    fingerprints.save(get_client(), "indicators", fps, [s for s in indicators if s not in failed])
+    ctx["symbols"], ctx["history"], ctx["indicators"], ctx["candles"] = symbols, history, indicators, candles
+    log(f"indicators: {nt} technical rows, {nc} candle rows upserted, {len(symbols) - len(todo)} unchanged")
+
+def stage_forecast(ctx):
+    sb = forecast_mod.get_client()
+    history = ctx.get("history") or {}
+    indicators = ctx.get("indicators") or {}
+    candles = ctx.get("candles") or {}
+    symbols = ctx.get("symbols") or forecast_mod.list_tracked_symbols(sb)
+    todo, fps = fingerprints.filter_changed(sb, "forecast", sorted(symbols), forecast_mod.MODEL_VERSION)
+    forecast_mod.load_feature_sets(sb, todo)
+    deadline = ctx.get("deadline")
+    sched = forecast_mod.DeadlineScheduler(sb, todo, deadline, ctx["started"]) if deadline else None
+    plan = sched.plan() if sched else ((sym, False) for sym in todo)
+    batch, ok, skipped, done = forecast_mod.ForecastBatch(sb, CHUNK), 0, 0, []
+    for sym, lite in tqdm(plan, total=len(todo), desc="Forecast", unit="sym"):
+        t0 = time.monotonic()
+        try:
+            if sym in history:
+                dfh = forecast_mod.normalize_hist(history[sym])
+            else:
+                dfh = forecast_mod.fetch_hist(sb, sym)
+            sym_rows = None
+            if forecast_mod.has_enough_history(dfh):
+                if sym in indicators:
+                    dfi = forecast_mod.normalize_extra(indicators[sym])
+                else:
+                    dfi = forecast_mod.fetch_indicators(sb, sym)
+                if sym in candles:
+                    dfc = forecast_mod.normalize_extra(candles[sym])
+                else:
+                    dfc = forecast_mod.fetch_candles(sb, sym)
+                sym_rows = forecast_mod.forecast_rows(sym, dfh, dfi, dfc, lite)
+            if not lite:
+                done.append(sym)
+        except Exception as e:
+            print(f"[WARN] forecast failed for {sym}: {e}")
+            sym_rows = None
+        if sched:
+            sched.record(sym, lite, time.monotonic() - t0)
+        if sym_rows:
+            batch.add(sym_rows); ok += 1
+        else:
+            skipped += 1
+    evaluated = batch.complete()
+    fingerprints.save(sb, "forecast", fps, [s for s in done if s not in batch.failed])
+    forecast_mod.save_feature_sets(sb)
+    forecast_mod.save_shadow_forecasts(sb)
+    forecast_mod.report_feature_budget()
+    forecast_mod.report_model_updates()
+    forecast_mod.report_shadow()
+    if sched:
+        sched.save()
+        log(sched.summary())
+    log(f"forecast: predicted {ok}, skipped {skipped}, unchanged {len(symbols) - len(todo)}, evaluated {evaluated}")
+
+RUNNERS = {
+    "prices": stage_prices,
+    "history": stage_history,
+    "indicators": stage_indicators,
+    "forecast": stage_forecast,
+}
+
+# ========== اختيار المراحل ==========
+def select_stages(only=None, start=None):
+    if only:
+        chosen = [s.strip() for s in only.split(",") if s.strip()]
+        unknown = [s for s in chosen if s not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown stage(s): {', '.join(unknown)}")
+        return [s for s in STAGES if s in chosen]
+    if start:
+        if start not in STAGES:
+            raise ValueError(f"Unknown stage: {start}")
+        return STAGES[STAGES.index(start):]
+    return list(STAGES)
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Run the nightly pipeline stages in one process.")
+    group = ap.add_mutually_exclusive_group()
+    group.add_argument("--only", help=f"comma-separated stages to run ({','.join(STAGES)})")
+    group.add_argument("--from", dest="start", choices=STAGES, help="run this stage and everything after it")
+    ap.add_argument("--deadline", default=forecast_mod.FORECAST_DEADLINE,
+                    help="wall-clock budget for the whole run, e.g. 160m; the forecast stage plans around it")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    stages = select_stages(args.only, args.start)
+    log(f"stages: {' -> '.join(stages)}")
+    ctx = {"started": time.monotonic(), "deadline": forecast_mod.parse_duration(args.deadline)}
+    for name in stages:
+        missing = [d for d in DEPENDS[name] if d not in stages]
+        if missing:
+            log(f"{name}: upstream {', '.join(missing)} not selected; loading inputs from Supabase")
+        t0 = time.time()
+        RUNNERS[name](ctx)
+        log(f"{name}: finished in {time.time() - t0:.1f}s")
+    row_diff.report()
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as exc:
+        log(f"Failed: {exc}")
+        traceback.print_exc()
+        sys.exit(1)
@@ -1,78 +1,169 @@
 import os, time, traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta, timezone
-import pandas as pd
-import yfinance as yf
-from dotenv import load_dotenv
-from supabase import create_client
 from tqdm import tqdm
+import pg_bulk
+import row_diff
+from pipeline_core import get_client, load_symbols, yahoo_symbol, lazy_import
+
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
 
-load_dotenv()
 TZ = timezone(timedelta(hours=3))
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
-SYMBOLS_FILTER = [s.strip().upper() for s in os.getenv("SYMBOLS_FILTER","").split(",") if s.strip()]
+# 1 = جلب قصير (HISTORY_SHORT_PERIOD) لكل رمز بدل 6 أشهر، مع كشف الأحداث المؤسسية:
+# الرمز الذي ظهر له split أو تغيّرت شموعه المتداخلة مع المخزّن يُعاد تنزيل سجله كاملاً
+# (HISTORY_REBUILD_PERIOD) وتُحذف حالة مؤشراته ليُعاد حسابها من البداية.
+# السجل الكامل قد يتجاوز 1000 صف: المؤشرات تقرؤه على صفحات، والتوقع يقرأ آخر FORECAST_HIST_ROWS شمعة.
+HISTORY_INCREMENTAL = os.getenv("HISTORY_INCREMENTAL", "0") == "1"
+HISTORY_SHORT_PERIOD = os.getenv("HISTORY_SHORT_PERIOD", "1mo")
+HISTORY_REBUILD_PERIOD = os.getenv("HISTORY_REBUILD_PERIOD", "max")
+OVERLAP_TOLERANCE = 0.005  # 0.5% فرق وسيط في الإغلاق على الأيام المتداخلة
+MIN_OVERLAP = 3
 
-def get_client():
-    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
-        print("[WARN] Missing Supabase env vars.")
-        return None
-    try:
-        return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE)
-    except Exception as e:
-        print(f"[WARN] Cannot connect Supabase: {e}")
-        return None
+# HISTORY_WORKERS > 1: تنزيلات Yahoo متوازية في خيوط (الطلب ينتظر الشبكة معظم وقته)،
+# والخيط الرئيسي وحده يكتب historical_data بدفعات متعددة الرموز من HISTORY_WRITE_CHUNK صف.
+HISTORY_WORKERS = int(os.getenv("HISTORY_WORKERS", "1"))
+HISTORY_WRITE_CHUNK = int(os.getenv("HISTORY_WRITE_CHUNK", "5000"))
 
-sb = get_client()
+# symbol -> سبب إعادة البناء (لهذا التشغيل)
+REBUILT = {}
 
-def load_symbols():
-    """Load only symbols marked is_tracked=True (i.e., passed prices update)."""
+def upsert_rows(rows):
+    sb = get_client()
+    rows = row_diff.filter_changed(sb, "historical_data", rows)
+    if not rows:
+        return
+    if pg_bulk.enabled():
+        try:
+            pg_bulk.copy_upsert("historical_data", rows, ["stock_symbol", "date"])
+            row_diff.mark_written(sb, "historical_data", rows)
+        except Exception as e:
+            print(f"[WARN] COPY upsert historical_data failed: {e}")
+        return
     if sb is None:
-        return SYMBOLS_FILTER
+        return
     try:
-        q = sb.table("stocks").select("symbol").eq("is_tracked", True).execute()
-        syms = [r["symbol"] for r in (q.data or []) if r.get("symbol")]
-        if SYMBOLS_FILTER:
-            syms = [s for s in syms if s in SYMBOLS_FILTER]
-        return syms
+        sb.table("historical_data").upsert(rows, on_conflict="stock_symbol,date").execute()
+        row_diff.mark_written(sb, "historical_data", rows)
     except Exception as e:
-        print(f"[WARN] load_symbols failed: {e}")
-        return SYMBOLS_FILTER
+        print(f"[WARN] upsert_rows failed: {e}")
 
-def yahoo_symbol(sym: str) -> str:
-    """Yahoo uses '-' instead of '.' for share classes (e.g., BRK.B -> BRK-B)."""
-    return sym.replace(".", "-")
+def download(sym: str, period: str):
+    """Yahoo history as (DataFrame, split dates). Close is split-adjusted, not dividend-adjusted."""
+    t = yf.Ticker(yahoo_symbol(sym))
+    df = t.history(period=period, auto_adjust=False)
+    if df is None or df.empty:
+        return None, []
+    splits = []
+    if "Stock Splits" in df.columns:
+        ev = pd.to_numeric(df["Stock Splits"], errors="coerce").fillna(0)
+        splits = [d.date().isoformat() for d in df.index[ev != 0]]
+    # Ensure columns exist and numeric
+    df = df[['Open','High','Low','Close','Volume']].apply(pd.to_numeric, errors='coerce').dropna()
+    return df, splits
 
-def upsert_rows(rows):
-    if sb is None or not rows:
+def fetch_symbol_rows(sym: str):
+    """Download ~last 90 trading days from Yahoo as historical_data rows (no DB write)."""
+    # 6 months window usually > 90 trading days; we then trim to ~130 rows to be safe
+    df, _ = download(sym, "6mo")
+    if df is None:
+        return []
+    return frame_to_rows(sym, df.tail(130))  # ~90 business days safeguard
+
+def frame_to_rows(sym: str, df):
+    df = df.reset_index()
+    rows = []
+    for _, r in df.iterrows():
+        rows.append({
+            "stock_symbol": sym,
+            "date": r["Date"].date().isoformat(),
+            "open": float(r["Open"]) if pd.notna(r["Open"]) else None,
+            "high": float(r["High"]) if pd.notna(r["High"]) else None,
+            "low": float(r["Low"]) if pd.notna(r["Low"]) else None,
+            "close": float(r["Close"]) if pd.notna(r["Close"]) else None,
+            "volume": int(r["Volume"]) if pd.notna(r["Volume"]) else None,
+        })
+    return rows
+
+def load_stored_closes(sym: str, since: str):
+    """{date: close} المخزّنة للرمز منذ since (للمقارنة مع النافذة الجديدة)."""
+    sb = get_client()
+    if sb is None:
+        return {}
+    res = (sb.table("historical_data").select("date,close")
+             .eq("stock_symbol", sym).gte("date", since).execute())
+    return {str(r["date"]): r["close"] for r in (res.data or []) if r.get("close") is not None}
+
+def detect_corporate_action(rows, stored_closes, splits):
+    """
+    سبب إعادة البناء أو None:
+    - split جديد بعد آخر شمعة مخزّنة (من أحداث Yahoo)، أو
+    - تغيّر منهجي في الإغلاق على الأيام المتداخلة (Yahoo أعاد كتابة التاريخ).
+    التوزيعات لا تغيّر Close مع auto_adjust=False فلا تستدعي إعادة بناء.
+    """
+    # split سبق آخر شمعة مخزّنة طُبّق في إعادة بناء سابقة
+    latest = max(stored_closes) if stored_closes else ""
+    new_splits = [d for d in splits if d > latest]
+    if new_splits:
+        return f"split {', '.join(new_splits)}"
+    diffs = []
+    for r in rows:
+        old = stored_closes.get(r["date"])
+        if old and r.get("close") is not None:
+            diffs.append(abs(r["close"] / float(old) - 1.0))
+    if len(diffs) >= MIN_OVERLAP:
+        diffs.sort()
+        median = diffs[len(diffs) // 2]
+        if median > OVERLAP_TOLERANCE:
+            return f"overlap close changed {median:.1%}"
+    return None
+
+def fetch_symbol_update(sym: str, stored_closes=None):
+    """
+    النافذة القصيرة أو السجل الكامل عند حدث مؤسسي؛ يعيد (rows, reason).
+    stored_closes تُمرَّر إن كانت محمّلة مسبقاً (run_pipeline) وإلا تُقرأ من القاعدة.
+    """
+    df, splits = download(sym, HISTORY_SHORT_PERIOD)
+    if df is None:
+        return [], None
+    rows = frame_to_rows(sym, df)
+    if stored_closes is None:
+        stored_closes = load_stored_closes(sym, rows[0]["date"])
+    if not stored_closes:
+        # لا سجل مخزّن لهذا الرمز بعد: النافذة المعتادة
+        return fetch_symbol_rows(sym), None
+    reason = detect_corporate_action(rows, stored_closes, splits)
+    if reason:
+        full, _ = download(sym, HISTORY_REBUILD_PERIOD)
+        if full is not None:
+            return frame_to_rows(sym, full), reason
+        print(f"[WARN] full history download failed for {sym} ({reason})")
+    return rows, None
+
+def reset_indicator_state(syms):
+    """يحذف indicator_state للرموز المعاد بناؤها فيُعيد الوضع التراكمي حسابها كاملاً."""
+    sb = get_client()
+    if sb is None or not syms:
         return
     try:
-        sb.table("historical_data").upsert(rows, on_conflict="stock_symbol,date").execute()
+        sb.table("indicator_state").delete().in_("stock_symbol", list(syms)).execute()
     except Exception as e:
-        print(f"[WARN] upsert_rows failed: {e}")
+        print(f"[WARN] reset indicator_state failed: {e}")
+
+def fetch_symbol(sym: str):
+    """Rows to write for sym according to the mode (records full rebuilds in REBUILT)."""
+    if HISTORY_INCREMENTAL:
+        rows, reason = fetch_symbol_update(sym)
+        if reason:
+            REBUILT[sym] = reason
+        return rows
+    return fetch_symbol_rows(sym)
 
 def sync_symbol(sym: str) -> int:
-    """Fetch ~last 90 trading days and upsert. Returns number of rows upserted."""
+    """Fetch ~last 90 trading days (or the short window) and upsert. Returns number of rows upserted."""
     try:
-        t = yf.Ticker(yahoo_symbol(sym))
-        # 6 months window usually > 90 trading days; we then trim to ~130 rows to be safe
-        df = t.history(period="6mo", auto_adjust=False)
-        if df is None or df.empty:
-            return 0
-        # Ensure columns exist and numeric
-        df = df[['Open','High','Low','Close','Volume']].apply(pd.to_numeric, errors='coerce').dropna()
-        df = df.tail(130).reset_index()  # ~90 business days safeguard
-        rows = []
-        for _, r in df.iterrows():
-            rows.append({
-                "stock_symbol": sym,
-                "date": r["Date"].date().isoformat(),
-                "open": float(r["Open"]) if pd.notna(r["Open"]) else None,
-                "high": float(r["High"]) if pd.notna(r["High"]) else None,
-                "low": float(r["Low"]) if pd.notna(r["Low"]) else None,
-                "close": float(r["Close"]) if pd.notna(r["Close"]) else None,
-                "volume": int(r["Volume"]) if pd.notna(r["Volume"]) else None,
-            })
+        rows = fetch_symbol(sym)
         upsert_rows(rows)
         return len(rows)
     except Exception as e:
@@ -80,19 +171,73 @@ def sync_symbol(sym: str) -> int:
         traceback.print_exc()
         return 0
 
+def _download_task(sym: str):
+    try:
+        return fetch_symbol(sym)
+    except Exception as e:
+        print(f"[WARN] sync_symbol failed for {sym}: {e}")
+        traceback.print_exc()
+        return []
+    finally:
+        time.sleep(0.05)
+
+def sync_concurrent(symbols, bar) -> int:
+    """
+    HISTORY_WORKERS تنزيلاً متوازياً بحد أقصى 4×HISTORY_WORKERS رمزاً قيد الانتظار في الذاكرة؛
+    الصفوف المكتملة تتجمّع وتُكتب عند بلوغ HISTORY_WRITE_CHUNK صف. الشريط يتقدّم مع كل تنزيل مكتمل.
+    """
+    total_rows, buf = 0, []
+    limit = max(1, HISTORY_WORKERS) * 4
+    todo = iter(symbols)
+    with ThreadPoolExecutor(max_workers=max(1, HISTORY_WORKERS)) as pool:
+        running = {}
+        def refill():
+            while len(running) < limit:
+                sym = next(todo, None)
+                if sym is None:
+                    return
+                running[pool.submit(_download_task, sym)] = sym
+        refill()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                sym = running.pop(fut)
+                rows = fut.result()
+                buf.extend(rows)
+                total_rows += len(rows)
+                bar.set_postfix({"last": sym, "rows": len(rows), "total_rows": total_rows, "pending_write": len(buf)})
+                bar.update(1)
+            refill()
+            if len(buf) >= HISTORY_WRITE_CHUNK:
+                upsert_rows(buf)
+                buf = []
+    if buf:
+        upsert_rows(buf)
+    return total_rows
+
 def main():
     symbols = load_symbols()
     total = len(symbols)
-    print(f"[INFO] Syncing historical ~90d for {total} tracked symbols...")
+    window = f"{HISTORY_SHORT_PERIOD} (incremental)" if HISTORY_INCREMENTAL else "~90d"
+    print(f"[INFO] Syncing historical {window} for {total} tracked symbols"
+          + (f" ({HISTORY_WORKERS} download workers)..." if HISTORY_WORKERS > 1 else "..."))
     total_rows = 0
     with tqdm(total=total, desc="Historical 90d", unit="sym") as bar:
-        for idx, sym in enumerate(symbols, 1):
-            cnt = sync_symbol(sym)
-            total_rows += cnt
-            bar.set_postfix({"last": sym, "rows": cnt, "total_rows": total_rows, "done": f"{idx}/{total}"})
-            bar.update(1)
-            time.sleep(0.05)
+        if HISTORY_WORKERS > 1:
+            total_rows = sync_concurrent(symbols, bar)
+        else:
+            for idx, sym in enumerate(symbols, 1):
+                cnt = sync_symbol(sym)
+                total_rows += cnt
+                bar.set_postfix({"last": sym, "rows": cnt, "total_rows": total_rows, "done": f"{idx}/{total}"})
+                bar.update(1)
+                time.sleep(0.05)
     print(f"[INFO] Done. Total rows upserted: {total_rows}")
+    if REBUILT:
+        reset_indicator_state(REBUILT)
+        for sym, reason in sorted(REBUILT.items()):
+            print(f"[INFO] full history rebuilt for {sym}: {reason}")
+    row_diff.report()
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,10 @@
 import os
 import time
 import json
+import argparse
 import traceback
-from datetime import datetime, timezone
-from urllib import request, error
+from datetime import datetime, timedelta, timezone
+from urllib import request, error, parse
 
 try:
     from dotenv import load_dotenv
@@ -15,12 +16,23 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE") or os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
 YAHOO_QUOTE_ENDPOINT = "https://query1.finance.yahoo.com/v7/finance/quote?symbols=%5EIXIC"
+YAHOO_CHART_ENDPOINT = "https://query1.finance.yahoo.com/v8/finance/chart/%5EIXIC?period1={start}&period2={end}&interval=1d"
 YAHOO_NEWS_ENDPOINT = "https://query1.finance.yahoo.com/v2/finance/news?category=generalnews&symbol=%5EIXIC&region=US"
 YAHOO_SECTOR_ENDPOINT = "https://query1.finance.yahoo.com/v1/finance/screener/predefined/saved?scrIds=sector_etf&count=25"
 YAHOO_HEATMAP_ENDPOINT = "https://query1.finance.yahoo.com/v7/finance/quote?symbols={symbols}"
 NASDAQ_ADVANCERS_ENDPOINT = "https://api.nasdaq.com/api/marketmovers?type=advancers&exchange=nasdaq"
 NASDAQ_DECLINERS_ENDPOINT = "https://api.nasdaq.com/api/marketmovers?type=decliners&exchange=nasdaq"
 
+BACKFILL_DAYS = int(os.getenv("NASDAQ_BACKFILL_DAYS", "90"))
+# What a daily-history bar cannot provide; recorded in metadata.notices of backfilled rows
+BACKFILL_NOTICES = [
+    "backfilled_from_daily_history",
+    "advancers_decliners_unavailable",
+    "sector_performance_unavailable",
+    "heatmap_unavailable",
+    "headline_unavailable",
+]
+
 BIG_TECH_SYMBOLS = ["AAPL", "MSFT", "NVDA", "GOOGL", "AMZN", "META", "TSLA", "AVGO", "NFLX", "ADBE"]
 
 NASDAQ_HEADERS = {
@@ -178,17 +190,20 @@ def fetch_headline():
     return None, None
 
 
-def call_supabase(payload: dict):
+def supabase_headers():
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
         raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE")
-
-    url = f"{SUPABASE_URL}/rest/v1/rpc/upsert_nasdaq_daily_snapshot"
-    body = json.dumps(payload).encode("utf-8")
-    headers = {
+    return {
         "Content-Type": "application/json",
         "apikey": SUPABASE_SERVICE_ROLE,
         "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE}",
     }
+
+
+def call_supabase(payload: dict, rpc: str = "upsert_nasdaq_daily_snapshot"):
+    headers = supabase_headers()
+    url = f"{SUPABASE_URL}/rest/v1/rpc/{rpc}"
+    body = json.dumps(payload).encode("utf-8")
     req = request.Request(url, data=body, headers=headers, method="POST")
     with request.urlopen(req, timeout=30) as resp:
         resp_body = resp.read().decode("utf-8")
@@ -200,7 +215,101 @@ def call_supabase(payload: dict):
             return None
 
 
-def main():
+# ========== Backfill ==========
+def fetch_snapshot_dates(since: str):
+    """trading_date values already stored on or after `since`."""
+    query = parse.urlencode({"select": "trading_date", "trading_date": f"gte.{since}", "order": "trading_date"})
+    req = request.Request(f"{SUPABASE_URL}/rest/v1/nasdaq_daily_snapshot?{query}", headers=supabase_headers())
+    with request.urlopen(req, timeout=30) as resp:
+        return {row["trading_date"] for row in json.loads(resp.read().decode("utf-8"))}
+
+
+def fetch_daily_bars(start: datetime, end: datetime):
+    """^IXIC daily OHLCV between start and end in a single chart request, oldest first."""
+    url = YAHOO_CHART_ENDPOINT.format(start=int(start.timestamp()), end=int(end.timestamp()))
+    data = fetch_json(url)
+    result = (data.get("chart", {}).get("result") or [None])[0]
+    if not result:
+        raise RuntimeError("Yahoo Finance chart response empty")
+    offset = timedelta(seconds=result.get("meta", {}).get("gmtoffset") or 0)
+    quote = (result.get("indicators", {}).get("quote") or [{}])[0]
+    timestamps = result.get("timestamp") or []
+    series = {key: (quote.get(key) or [None] * len(timestamps)) for key in ("open", "high", "low", "close", "volume")}
+    bars = []
+    for i, ts in enumerate(timestamps):
+        bar = {key: parse_number(values[i]) if i < len(values) else None for key, values in series.items()}
+        if bar["close"] is None:
+            continue
+        bar["trading_date"] = (datetime.fromtimestamp(ts, timezone.utc) + offset).date().isoformat()
+        bars.append(bar)
+    return bars
+
+
+def backfill_rows(bars, stored_dates, since: str):
+    """Snapshot rows for the bars on or after `since` whose trading_date is missing from the table."""
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    rows, prev_close = [], None
+    for bar in bars:
+        if bar["trading_date"] >= since and bar["trading_date"] not in stored_dates:
+            notices = list(BACKFILL_NOTICES)
+            change = change_pct = None
+            if prev_close:
+                change = bar["close"] - prev_close
+                change_pct = change / prev_close * 100
+            else:
+                notices.append("change_unavailable")
+            rows.append({
+                "trading_date": bar["trading_date"],
+                "close_price": bar["close"],
+                "change_points": change,
+                "change_percent": change_pct,
+                "open_price": bar["open"],
+                "high_price": bar["high"],
+                "low_price": bar["low"],
+                "volume": int(bar["volume"]) if bar["volume"] is not None else None,
+                "metadata_json": {
+                    "fetched_at": fetched_at,
+                    "source": "Yahoo Finance chart (backfill)",
+                    "notices": notices,
+                },
+            })
+        prev_close = bar["close"]
+    return rows
+
+
+def backfill(days: int = BACKFILL_DAYS):
+    """Fill trading days missing from nasdaq_daily_snapshot over the last `days` days."""
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=days)
+    since = start.date().isoformat()
+    stored = fetch_snapshot_dates(since)
+    # a week of extra history so the first missing day still has a previous close
+    bars = fetch_daily_bars(start - timedelta(days=7), end)
+    rows = backfill_rows(bars, stored, since)
+    if not rows:
+        log(f"Backfill: no missing trading days in the last {days} days.")
+        return 0
+    log(f"Backfill: {len(rows)} missing trading days ({rows[0]['trading_date']} .. {rows[-1]['trading_date']})")
+    written = call_supabase({"p_rows": rows}, rpc="upsert_nasdaq_daily_snapshots")
+    log(f"Backfill: {written} rows written.")
+    return written
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Record the Nasdaq daily snapshot.")
+    ap.add_argument("--backfill", action="store_true",
+                    help="also fill trading days missing from nasdaq_daily_snapshot from daily history")
+    ap.add_argument("--days", type=int, default=BACKFILL_DAYS, help="backfill lookback in calendar days")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.backfill:
+        try:
+            backfill(args.days)
+        except Exception as exc:
+            log(f"warn: backfill failed -> {exc}")
     log("Collecting Nasdaq snapshot...")
     quote = fetch_quote()
     adv_decl = fetch_advancers_decliners()
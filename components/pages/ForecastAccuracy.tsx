@@ -98,6 +98,65 @@ const formatDate = (dateString: string, t?: (key: string) => string) => {
   }
 };
 
+// --- Accuracy aggregates (get_forecast_accuracy_summary) ---
+interface AccuracySummaryRow {
+  stock_symbol: string;
+  model_version: string;
+  total_forecasts_60: number;
+  hit_count_60: number;
+  avg_abs_error_60: number;
+  avg_pct_error_60: number;
+  avg_confidence_60: number;
+  last_forecast_date: string | null;
+}
+
+// The aggregates hold one row per (symbol, model_version); keep the model with the
+// latest evaluation per symbol and use its last 60 evaluations. This window is not the
+// page date range used by the date/confidence charts, so the UI labels it.
+const summaryToAccuracyStats = (rows: AccuracySummaryRow[]): Pick<ForecastAccuracyStats, 'overall' | 'by_stock'> => {
+  const latest = new Map<string, AccuracySummaryRow>();
+  for (const row of rows) {
+    const current = latest.get(row.stock_symbol);
+    if (!current || (row.last_forecast_date || '') > (current.last_forecast_date || '')) {
+      latest.set(row.stock_symbol, row);
+    }
+  }
+
+  const current = Array.from(latest.values()).filter((row) => row.total_forecasts_60 > 0);
+  const total = current.reduce((sum, row) => sum + row.total_forecasts_60, 0);
+  const hits = current.reduce((sum, row) => sum + row.hit_count_60, 0);
+  const weighted = (key: 'avg_abs_error_60' | 'avg_pct_error_60' | 'avg_confidence_60') =>
+    total > 0 ? current.reduce((sum, row) => sum + row[key] * row.total_forecasts_60, 0) / total : 0;
+  const rate = (hitCount: number, count: number) => (count > 0 ? Math.round((hitCount / count) * 10000) / 100 : 0);
+
+  const by_stock = current
+    .filter((row) => row.total_forecasts_60 >= 3)
+    .map((row) => ({
+      stock_symbol: row.stock_symbol,
+      total_forecasts: row.total_forecasts_60,
+      hit_count: row.hit_count_60,
+      miss_count: row.total_forecasts_60 - row.hit_count_60,
+      hit_rate: rate(row.hit_count_60, row.total_forecasts_60),
+      avg_abs_error: row.avg_abs_error_60,
+      avg_pct_error: row.avg_pct_error_60,
+      avg_confidence: row.avg_confidence_60,
+    }))
+    .sort((a, b) => b.hit_rate - a.hit_rate || b.total_forecasts - a.total_forecasts);
+
+  return {
+    overall: {
+      total_forecasts: total,
+      hit_range_count: hits,
+      miss_range_count: total - hits,
+      hit_rate: rate(hits, total),
+      avg_abs_error: weighted('avg_abs_error_60'),
+      avg_pct_error: weighted('avg_pct_error_60'),
+      avg_confidence: weighted('avg_confidence_60'),
+    },
+    by_stock,
+  };
+};
+
 // Actual Range Display Component - matches StockDetails page format
 const ActualRangeDisplay: React.FC<{ low: number | null; high: number | null; t?: (key: string) => string }> = memo(({ low, high, t }) => {
   if ((low === null || low === undefined) && (high === null || high === undefined)) {
@@ -869,16 +928,9 @@ const ForecastAccuracy: React.FC = () => {
       setError(null);
       
       try {
-        // Fetch basic stats
-        const [overallResult, byStockResult, byDateResult, byConfidenceResult, recentForecastsResult] = await Promise.all([
-          supabase.rpc('get_forecast_accuracy_overall', {
-            p_start_date: defaultStartDate,
-            p_end_date: defaultEndDate,
-          }),
-          supabase.rpc('get_forecast_accuracy_by_stock', {
-            p_start_date: defaultStartDate,
-            p_end_date: defaultEndDate,
-          }),
+        // Fetch basic stats (headline and per-stock figures come from the aggregates)
+        const [summaryResult, byDateResult, byConfidenceResult, recentForecastsResult] = await Promise.all([
+          supabase.rpc('get_forecast_accuracy_summary'),
           supabase.rpc('get_forecast_accuracy_by_date', {
             p_start_date: defaultStartDate,
             p_end_date: defaultEndDate,
@@ -923,8 +975,7 @@ const ForecastAccuracy: React.FC = () => {
         ]);
 
         // Check for errors
-        if (overallResult.error) throw overallResult.error;
-        if (byStockResult.error) throw byStockResult.error;
+        if (summaryResult.error) throw summaryResult.error;
         if (byDateResult.error) throw byDateResult.error;
         if (byConfidenceResult.error) throw byConfidenceResult.error;
 
@@ -967,17 +1018,10 @@ const ForecastAccuracy: React.FC = () => {
         }
 
         // Combine results
+        const { overall, by_stock } = summaryToAccuracyStats(summaryResult.data || []);
         const combinedStats: ForecastAccuracyStats = {
-          overall: overallResult.data || {
-            total_forecasts: 0,
-            hit_range_count: 0,
-            miss_range_count: 0,
-            hit_rate: 0,
-            avg_abs_error: 0,
-            avg_pct_error: 0,
-            avg_confidence: 0,
-          },
-          by_stock: byStockResult.data || [],
+          overall,
+          by_stock,
           by_date: byDateResult.data || [],
           by_confidence: byConfidenceResult.data || {
             high_confidence: { count: 0, hit_rate: 0 },
@@ -1527,6 +1571,9 @@ const topStocksData = useMemo(() => {
                 <p className="text-[11px] text-gray-500 dark:text-gray-400">
                   {t('overall_performance_gauge') || 'مؤشر الأداء الإجمالي'}
                 </p>
+                <p className="text-[11px] text-gray-400 dark:text-gray-500">
+                  {t('last_60_evaluations_per_stock')}
+                </p>
               </div>
             </div>
           </div>
@@ -1709,6 +1756,9 @@ const topStocksData = useMemo(() => {
         <h2 className="text-lg font-bold text-gray-900 dark:text-white text-center">
           {t('stock_performance_table')}
         </h2>
+        <p className="text-center text-xs text-gray-500 dark:text-gray-400">
+          {t('last_60_evaluations_per_stock')}
+        </p>
         <div className="mx-auto max-w-5xl space-y-4">
           {/* Search and Filters Tools */}
           <div className="flex flex-col items-stretch gap-3 sm:flex-row sm:items-center">
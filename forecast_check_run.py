@@ -1 +1,337 @@
-�jh��,�jh�
\ No newline at end of file
+
+import os
+import io
+import argparse
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+# -- Settings and Database Connection --
+
+# Load environment variables from a .env file (optional, but good practice)
+load_dotenv()
+
+# Retrieve connection info from environment variables
+DB_HOST = os.getenv("DB_HOST", "your_supabase_host.supabase.co")
+DB_NAME = os.getenv("DB_NAME", "postgres")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "your_supabase_db_password")
+DB_PORT = os.getenv("DB_PORT", "5432")
+
+# Columns written to the staging table (order matters for COPY)
+RESULT_COLUMNS = [
+    "stock_symbol", "stock_name", "forecast_date", "predicted_price", "predicted_lo", "predicted_hi",
+    "actual_low", "actual_high", "actual_close", "hit_range", "abs_error", "pct_error", "confidence",
+]
+
+def get_db_connection():
+    """Create and return a database connection."""
+    try:
+        conn = psycopg2.connect(
+            host=DB_HOST,
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT
+        )
+        print("Successfully connected to the database.")
+        return conn
+    except psycopg2.OperationalError as e:
+        print(f"Database connection error: {e}")
+        return None
+
+# -- Data Fetching Functions --
+
+def _read_frame(cursor, query, params=None):
+    cursor.execute(query, params)
+    cols = [d[0] for d in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=cols)
+
+def get_latest_unevaluated_forecasts(cursor):
+    """
+    Fetch the single most recent forecast for each tracked stock that does not
+    yet have an entry in forecast_check_history, joined to its actual prices
+    in the same query (actual columns are NULL when the bar is not in yet).
+    """
+    query = sql.SQL("""
+        WITH latest_forecasts AS (
+            SELECT DISTINCT ON (f.stock_symbol)
+                f.stock_symbol,
+                s.name as stock_name,
+                f.forecast_date,
+                f.predicted_price,
+                f.predicted_lo,
+                f.predicted_hi,
+                f.confidence
+            FROM public.forecasts f
+            JOIN public.stocks s ON f.stock_symbol = s.symbol
+            WHERE s.is_tracked = TRUE
+            ORDER BY f.stock_symbol, f.forecast_date DESC
+        )
+        SELECT lf.*, h.low AS actual_low, h.high AS actual_high, h.close AS actual_close
+        FROM latest_forecasts lf
+        LEFT JOIN public.forecast_check_history fch
+            ON lf.stock_symbol = fch.stock_symbol AND lf.forecast_date = fch.forecast_date
+        LEFT JOIN public.historical_data h
+            ON lf.stock_symbol = h.stock_symbol AND lf.forecast_date = h.date
+        WHERE fch.stock_symbol IS NULL;
+    """)
+    df = _read_frame(cursor, query)
+    print(f"Found {len(df)} new/unevaluated latest forecasts to check.")
+    return df
+
+def get_forecasts_in_range(cursor, start_date, end_date):
+    """Fetch every forecast in [start_date, end_date] with its actual prices (backfill mode)."""
+    query = sql.SQL("""
+        SELECT
+            f.stock_symbol,
+            s.name as stock_name,
+            f.forecast_date,
+            f.predicted_price,
+            f.predicted_lo,
+            f.predicted_hi,
+            f.confidence,
+            h.low AS actual_low,
+            h.high AS actual_high,
+            h.close AS actual_close
+        FROM public.forecasts f
+        JOIN public.stocks s ON f.stock_symbol = s.symbol
+        LEFT JOIN public.historical_data h
+            ON f.stock_symbol = h.stock_symbol AND f.forecast_date = h.date
+        WHERE f.forecast_date BETWEEN %s AND %s;
+    """)
+    df = _read_frame(cursor, query, (start_date, end_date))
+    print(f"Found {len(df)} forecasts between {start_date} and {end_date}.")
+    return df
+
+# -- Processing and Saving Functions --
+
+def evaluate_forecasts(df):
+    """
+    Evaluate all forecasts at once. Rows without actual prices are dropped
+    (they will be re-checked on the next run).
+    """
+    if df.empty:
+        return df
+    has_actual = df["actual_low"].notna() & df["actual_high"].notna()
+    missing = int((~has_actual).sum())
+    if missing:
+        print(f"Info: No historical price data yet for {missing} forecast(s). They will be re-checked on the next run.")
+    df = df[has_actual].copy()
+    if df.empty:
+        return df
+
+    num = ["predicted_price", "predicted_lo", "predicted_hi", "actual_low", "actual_high", "actual_close", "confidence"]
+    df[num] = df[num].astype(float)
+
+    # Hit logic: Does the predicted range overlap with the actual range?
+    df["hit_range"] = (df["predicted_lo"] <= df["actual_high"]) & (df["actual_low"] <= df["predicted_hi"])
+
+    # Error metrics (NaN -> NULL when predicted_price or actual_close is missing)
+    df["abs_error"] = (df["predicted_price"] - df["actual_close"]).abs()
+    close = df["actual_close"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(close > 0, df["abs_error"].to_numpy() / close, 0.0)  # Avoid division by zero
+    df["pct_error"] = np.where(df["abs_error"].isna(), np.nan, pct)
+    return df[RESULT_COLUMNS]
+
+def copy_to_staging(cursor, results):
+    """COPY the evaluated rows once into a temporary staging table."""
+    cursor.execute("""
+        CREATE TEMP TABLE forecast_check_staging (
+            stock_symbol text, stock_name text, forecast_date date,
+            predicted_price double precision, predicted_lo double precision, predicted_hi double precision,
+            actual_low double precision, actual_high double precision, actual_close double precision,
+            hit_range boolean, abs_error double precision, pct_error double precision, confidence double precision
+        ) ON COMMIT DROP;
+    """)
+    buf = io.StringIO()
+    results.to_csv(buf, index=False, header=False, na_rep="")
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY forecast_check_staging ({', '.join(RESULT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def save_results(cursor, results):
+    """Fan the staged results out to all three database tables."""
+    if results is None or results.empty:
+        print("No results to save.")
+        return
+
+    copy_to_staging(cursor, results)
+
+    # 1. Save to forecast_check_history
+    history_query = sql.SQL("""
+        INSERT INTO public.forecast_check_history (
+            stock_symbol, forecast_date, predicted_price, predicted_lo, predicted_hi,
+            actual_low, actual_high, actual_close, hit_range, abs_error, pct_error, confidence
+        )
+        SELECT
+            stock_symbol, forecast_date, predicted_price, predicted_lo, predicted_hi,
+            actual_low, actual_high, actual_close, hit_range, abs_error, pct_error, confidence
+        FROM forecast_check_staging
+        ON CONFLICT (stock_symbol, forecast_date) DO UPDATE SET
+            predicted_price = EXCLUDED.predicted_price,
+            predicted_lo = EXCLUDED.predicted_lo,
+            predicted_hi = EXCLUDED.predicted_hi,
+            actual_low = EXCLUDED.actual_low,
+            actual_high = EXCLUDED.actual_high,
+            actual_close = EXCLUDED.actual_close,
+            hit_range = EXCLUDED.hit_range,
+            abs_error = EXCLUDED.abs_error,
+            pct_error = EXCLUDED.pct_error,
+            confidence = EXCLUDED.confidence,
+            created_at = NOW();
+    """)
+
+    # 2. Save to forecast_check_latest (newest evaluation per stock; a backfill
+    #    of older dates never replaces a newer latest row)
+    latest_query = sql.SQL("""
+        INSERT INTO public.forecast_check_latest AS l (
+            stock_symbol, forecast_date, predicted_price, predicted_lo, predicted_hi,
+            actual_low, actual_high, actual_close, hit_range, abs_error, pct_error, confidence
+        )
+        SELECT DISTINCT ON (stock_symbol)
+            stock_symbol, forecast_date, predicted_price, predicted_lo, predicted_hi,
+            actual_low, actual_high, actual_close, hit_range, abs_error, pct_error, confidence
+        FROM forecast_check_staging
+        ORDER BY stock_symbol, forecast_date DESC
+        ON CONFLICT (stock_symbol) DO UPDATE SET
+            forecast_date = EXCLUDED.forecast_date,
+            predicted_price = EXCLUDED.predicted_price,
+            predicted_lo = EXCLUDED.predicted_lo,
+            predicted_hi = EXCLUDED.predicted_hi,
+            actual_low = EXCLUDED.actual_low,
+            actual_high = EXCLUDED.actual_high,
+            actual_close = EXCLUDED.actual_close,
+            hit_range = EXCLUDED.hit_range,
+            abs_error = EXCLUDED.abs_error,
+            pct_error = EXCLUDED.pct_error,
+            confidence = EXCLUDED.confidence,
+            created_at = NOW()
+        WHERE l.forecast_date <= EXCLUDED.forecast_date;
+    """)
+
+    # 3. Save to Forcast_Result
+    forcast_result_query = sql.SQL("""
+        INSERT INTO public."Forcast_Result" (
+            stock_symbol, stock_name, forecast_date, predicted_lo, predicted_hi,
+            actual_low, actual_high, is_hit
+        )
+        SELECT
+            stock_symbol, stock_name, forecast_date, predicted_lo, predicted_hi,
+            actual_low, actual_high, hit_range
+        FROM forecast_check_staging
+        ON CONFLICT (stock_symbol, forecast_date) DO UPDATE SET
+            stock_name = EXCLUDED.stock_name,
+            predicted_lo = EXCLUDED.predicted_lo,
+            predicted_hi = EXCLUDED.predicted_hi,
+            actual_low = EXCLUDED.actual_low,
+            actual_high = EXCLUDED.actual_high,
+            is_hit = EXCLUDED.is_hit,
+            created_at = NOW();
+    """)
+
+    try:
+        cursor.execute(history_query)
+        cursor.execute(latest_query)
+        cursor.execute(forcast_result_query)
+        print(f"Successfully saved {len(results)} results to all three tables.")
+    except Exception as e:
+        print(f"An error occurred while saving results: {e}")
+        # This will be caught by the main try/except and cause a rollback
+        raise
+
+    refresh_accuracy_aggregates(cursor)
+
+def refresh_accuracy_aggregates(cursor):
+    """
+    Apply the staged dates to forecast_accuracy_agg (migration_180). Runs in a
+    savepoint so a database without the migration still keeps the results.
+    """
+    cursor.execute("SAVEPOINT accuracy_agg")
+    try:
+        cursor.execute("""
+            SELECT public.refresh_forecast_accuracy(
+                ARRAY(SELECT DISTINCT forecast_date FROM forecast_check_staging)
+            );
+        """)
+        print(f"Updated accuracy aggregates from {cursor.fetchone()[0]} evaluations.")
+        cursor.execute("RELEASE SAVEPOINT accuracy_agg")
+    except Exception as e:
+        print(f"Warning: could not update accuracy aggregates: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT accuracy_agg")
+
+def evaluate_shadow_forecasts(cursor):
+    """
+    Evaluate pending challenger forecasts in forecast_shadow (migration_186).
+    Runs in a savepoint so a database without the migration still evaluates
+    the production forecasts.
+    """
+    cursor.execute("SAVEPOINT shadow_eval")
+    try:
+        cursor.execute("SELECT public.evaluate_shadow_forecasts();")
+        count = cursor.fetchone()[0]
+        if count:
+            print(f"Evaluated {count} shadow forecasts.")
+        cursor.execute("RELEASE SAVEPOINT shadow_eval")
+    except Exception as e:
+        print(f"Warning: could not evaluate shadow forecasts: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT shadow_eval")
+
+# -- Main Execution Function --
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate forecasts against actual prices.")
+    parser.add_argument("--backfill", nargs=2, metavar=("START_DATE", "END_DATE"),
+                        help="re-evaluate every forecast with forecast_date in [START_DATE, END_DATE] in one pass")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Main function to run the forecast check process."""
+    args = parse_args(argv)
+    print("Starting forecast check process...")
+
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    try:
+        # Use a transaction block to ensure all or no data is written
+        with conn:
+            with conn.cursor() as cursor:
+                # Shadow forecasts do not depend on new production forecasts
+                evaluate_shadow_forecasts(cursor)
+
+                # 1. Load forecasts joined to their actual prices in a single query
+                if args.backfill:
+                    forecasts = get_forecasts_in_range(cursor, *args.backfill)
+                else:
+                    forecasts = get_latest_unevaluated_forecasts(cursor)
+                if forecasts.empty:
+                    print("No new forecasts to evaluate. Process complete.")
+                    return
+
+                # 2. Evaluate all of them with array operations
+                results = evaluate_forecasts(forecasts)
+
+                # 3. Stage once and fan out to all tables
+                if not results.empty:
+                    save_results(cursor, results)
+                else:
+                    print("No results were evaluated (likely due to missing historical data for the forecasts).")
+
+    except Exception as e:
+        print(f"An unexpected error occurred during the process: {e}")
+        # The 'with conn' block handles rollback on exception automatically
+    finally:
+        if conn:
+            conn.close()
+            print("Database connection closed.")
+
+    print("...Forecast check process finished.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""سكربتات الخط الليلي تعيش في .github وتستورد بعضها بالاسم، فنضيفها إلى sys.path."""
+
+import os, sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".github"))
+
+# كل المؤشرات التقنية في indicator_definitions بفتراتها الافتراضية
+TECHNICAL_DEFS = [{"type": "technical", "name": n, "period": None} for n in (
+    "RSI", "EMA12", "EMA26", "SMA20", "SMA50", "SMA200", "MACD", "MACD_signal", "MACD_histogram",
+    "Bollinger_upper", "Bollinger_middle", "Bollinger_lower", "Stochastic_K", "Stochastic_D", "Williams_%R")]
+
+def make_history(n=320, seed=0, start="2024-01-01"):
+    """سجل OHLCV يومي اصطناعي (مسار عشوائي هندسي) بنفس أعمدة historical_data."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = close * (1 + rng.normal(0, 0.003, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.004, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, n)))
+    return pd.DataFrame({
+        "date": pd.bdate_range(start, periods=n).strftime("%Y-%m-%d"),
+        "open": open_, "high": high, "low": low, "close": close,
+        "volume": rng.integers(100_000, 1_000_000, n),
+    })
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+class _Query:
+    """جزء supabase-py الذي تستخدمه السكربتات: select/eq/in_/gt/gte/lt/lte/order/limit/range/upsert/delete."""
+
+    def __init__(self, client, table):
+        self.client, self.table, self.filters = client, table, []
+        self.op, self.rows, self.keys, self.bounds = "select", None, None, None
+        self.orders, self.max_rows = [], client.max_rows
+
+    def select(self, *_):
+        return self
+
+    def eq(self, k, v):
+        self.filters.append(lambda r: r.get(k) == v); return self
+
+    def in_(self, k, values):
+        values = set(values)
+        self.filters.append(lambda r: r.get(k) in values); return self
+
+    def gte(self, k, v):
+        self.filters.append(lambda r: str(r.get(k)) >= str(v)); return self
+
+    def gt(self, k, v):
+        self.filters.append(lambda r: str(r.get(k)) > str(v)); return self
+
+    def lt(self, k, v):
+        self.filters.append(lambda r: str(r.get(k)) < str(v)); return self
+
+    def lte(self, k, v):
+        self.filters.append(lambda r: str(r.get(k)) <= str(v)); return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc)); return self
+
+    def limit(self, n):
+        self.max_rows = min(n, self.max_rows); return self
+
+    def range(self, start, end):
+        self.bounds = (start, end); return self
+
+    def upsert(self, rows, on_conflict):
+        self.op, self.rows, self.keys = "upsert", list(rows), on_conflict.split(","); return self
+
+    def delete(self):
+        self.op = "delete"; return self
+
+    def execute(self):
+        if self.table in self.client.failing:
+            raise RuntimeError(f"{self.table} unavailable")
+        stored = self.client.tables.setdefault(self.table, [])
+        if self.op == "upsert":
+            self.client.calls.append((self.table, len(self.rows)))
+            for row in self.rows:
+                key = tuple(row[c] for c in self.keys)
+                for i, old in enumerate(stored):
+                    if tuple(old.get(c) for c in self.keys) == key:
+                        stored[i] = {**old, **row}; break
+                else:
+                    stored.append(dict(row))
+            return _Result(self.rows)
+        data = [r for r in stored if all(f(r) for f in self.filters)]
+        if self.op == "delete":
+            self.client.tables[self.table] = [r for r in stored if r not in data]
+            return _Result(data)
+        for column, desc in reversed(self.orders):
+            data = sorted(data, key=lambda r: str(r.get(column)), reverse=desc)
+        if self.bounds:
+            data = data[self.bounds[0]:self.bounds[1] + 1]
+        return _Result(data[:self.max_rows])
+
+class FakeClient:
+    """
+    عميل Supabase في الذاكرة؛ rpcs = {name: fn(params)}، failing = جداول تفشل كل عملياتها.
+    القراءة تُقطع عند max_rows صف كحد PostgREST.
+    """
+
+    def __init__(self, rpcs=None, max_rows=1000):
+        self.tables, self.calls, self.failing, self.max_rows = {}, [], set(), max_rows
+        self.rpcs = dict(rpcs or {})
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params):
+        if name not in self.rpcs:
+            raise RuntimeError(f"function {name} does not exist")
+        data = self.rpcs[name](params)
+        return type("_Call", (), {"execute": lambda _self: _Result(data)})()
+
+@pytest.fixture(scope="session")
+def dsn(tmp_path_factory):
+    """Postgres للاختبار: TEST_DATABASE_URL (قاعدة تجريبية)، أو pgserver إن كان مثبّتاً؛ وإلا يُتخطّى الاختبار."""
+    if os.getenv("TEST_DATABASE_URL"):
+        return os.environ["TEST_DATABASE_URL"]
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(str(tmp_path_factory.mktemp("pg")), cleanup_mode="stop")
+    return server.get_uri()
+
+@pytest.fixture
+def fake_client():
+    return FakeClient()
+
+@pytest.fixture
+def history():
+    return make_history()
+
+@pytest.fixture
+def technical_defs():
+    return [dict(d) for d in TECHNICAL_DEFS]
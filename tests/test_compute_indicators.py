@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""compute_indicators_and_candles_v2: ما يُحفظ بعد الكتابة (حالة المؤشرات) يتبع نجاح الكتابة فقط."""
+
+import pytest
+
+import compute_indicators_and_candles_v2 as indicators
+
+@pytest.fixture
+def incremental(monkeypatch):
+    """main_incremental على رمزين A و B بلا قاعدة؛ B تفشل كتابة مؤشراته."""
+    saved = {}
+    monkeypatch.setattr(indicators, "load_states", lambda syms: {})
+    monkeypatch.setattr(indicators, "compute_symbol_incremental", lambda sym, defs, state: (
+        [{"stock_symbol": sym, "date": "2025-01-02", "rsi": 50.0}], [],
+        {"stock_symbol": sym, "last_date": "2025-01-02", "state": {}}))
+    monkeypatch.setattr(indicators, "upsert_indicators", lambda rows: rows[0]["stock_symbol"] != "B")
+    monkeypatch.setattr(indicators, "upsert_candles", lambda rows: True)
+    monkeypatch.setattr(indicators, "save_states", lambda rows: saved.setdefault("rows", list(rows)))
+    monkeypatch.setattr(indicators.row_diff, "report", lambda: None)
+    return saved
+
+def test_state_not_saved_when_write_fails(incremental):
+    indicators.main_incremental([], ["A", "B"])
+    assert [r["stock_symbol"] for r in incremental["rows"]] == ["A"]
+
+@pytest.fixture
+def sequential(monkeypatch, history, fake_client):
+    """main() بالوضع التسلسلي على رمزين A و B؛ B تفشل كتابة مؤشراته. يعيد الرموز المحفوظة بصماتها."""
+    saved = {}
+    monkeypatch.setattr(indicators, "INDICATORS_ENGINE", "python")
+    monkeypatch.setattr(indicators, "INDICATORS_INCREMENTAL", False)
+    monkeypatch.setattr(indicators, "INDICATORS_PIPELINED", False)
+    monkeypatch.setattr(indicators, "get_client", lambda: fake_client)
+    monkeypatch.setattr(indicators, "fetch_indicator_defs", lambda: [{"type": "technical", "name": "SMA20"}])
+    monkeypatch.setattr(indicators, "load_symbols", lambda: ["A", "B"])
+    monkeypatch.setattr(indicators, "fetch_history", lambda sym: history.copy())
+    monkeypatch.setattr(indicators, "upsert_indicators", lambda rows: rows[0]["stock_symbol"] != "B")
+    monkeypatch.setattr(indicators, "upsert_candles", lambda rows: True)
+    monkeypatch.setattr(indicators.fingerprints, "filter_changed",
+                        lambda sb, stage, syms, extra="": (list(syms), {s: "fp" for s in syms}))
+    monkeypatch.setattr(indicators.fingerprints, "save", lambda sb, stage, fps, done: saved.setdefault("done", list(done)))
+    return saved
+
+def test_fingerprint_not_saved_when_write_fails(sequential):
+    indicators.main()
+    assert sequential["done"] == ["A"]
+
+def test_incremental_fingerprint_follows_write(incremental, monkeypatch):
+    monkeypatch.setattr(indicators.row_diff, "report", lambda: None)
+    assert indicators.main_incremental([], ["A", "B"]) == ["A"]
+
+def test_write_helpers_report_failure(monkeypatch, fake_client):
+    monkeypatch.setattr(indicators, "get_client", lambda: fake_client)
+    monkeypatch.setattr(indicators.pg_bulk, "enabled", lambda: False)
+    rows = [{"stock_symbol": "A", "date": "2025-01-02", "rsi": 50.0}]
+    assert indicators.upsert_indicators(rows) is True
+    assert indicators.upsert_indicators([]) is True
+    fake_client.failing.add("technical_indicators")
+    assert indicators.upsert_indicators(rows) is False
+
+@pytest.fixture
+def pipelined(monkeypatch, history):
+    """main_pipelined على A و B و C؛ كتابة أي دفعة فيها B تفشل."""
+    monkeypatch.setattr(indicators, "fetch_history", lambda sym: history.copy())
+    monkeypatch.setattr(indicators, "upsert_indicators", lambda rows: all(r["stock_symbol"] != "B" for r in rows))
+    monkeypatch.setattr(indicators, "upsert_candles", lambda rows: True)
+    monkeypatch.setattr(indicators.row_diff, "report", lambda: None)
+
+def test_pipelined_done_follows_each_flush(pipelined, monkeypatch):
+    monkeypatch.setattr(indicators, "INDICATORS_WRITE_BATCH", 1)
+    assert indicators.main_pipelined([{"type": "technical", "name": "SMA20"}], ["A", "B", "C"]) == ["A", "C"]
+
+def test_pipelined_failed_flush_drops_its_symbols(pipelined, monkeypatch):
+    monkeypatch.setattr(indicators, "INDICATORS_WRITE_BATCH", 10**9)
+    assert indicators.main_pipelined([{"type": "technical", "name": "SMA20"}], ["A", "B", "C"]) == []
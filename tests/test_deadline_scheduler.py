@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""DeadlineScheduler: ترتيب الأولوية، وقرار full/lite حسب الوقت المتبقي، وتحديث الكلفة."""
+
+import pytest
+
+import forecast_generate_tracked_symbols_v6i_1day_silent as forecast
+from conftest import FakeClient
+
+PRIORITIES = [
+    {"stock_symbol": "A", "favorite_count": 0, "market_cap": 10, "full_seconds": 10.0, "lite_seconds": 1.0},
+    {"stock_symbol": "B", "favorite_count": 3, "market_cap": 1, "full_seconds": 10.0, "lite_seconds": 1.0},
+    {"stock_symbol": "C", "favorite_count": 0, "market_cap": 50, "full_seconds": 10.0, "lite_seconds": 1.0},
+]
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ساعة ثابتة تُقدَّم يدوياً."""
+    now = [1000.0]
+    monkeypatch.setattr(forecast.time, "monotonic", lambda: now[0])
+    return now
+
+def scheduler(deadline, rows=PRIORITIES):
+    sb = FakeClient({"get_forecast_priorities": lambda p: [r for r in rows if r["stock_symbol"] in p["p_symbols"]]})
+    return forecast.DeadlineScheduler(sb, ["A", "B", "C"], deadline / (1 - forecast.DEADLINE_MARGIN))
+
+def test_order_by_favorites_then_market_cap(clock):
+    assert scheduler(100).order == ["B", "C", "A"]
+
+def test_ample_deadline_runs_everything_full(clock):
+    assert list(scheduler(100).plan()) == [("B", False), ("C", False), ("A", False)]
+
+def test_tight_deadline_switches_the_tail_to_lite(clock):
+    sched = scheduler(22)
+    plan = sched.plan()
+    # B: 10 كامل + 2 خفيف للبقية <= 22
+    assert next(plan) == ("B", False)
+    clock[0] += 12
+    # C: المتبقي 10 < 10 كامل + 1 خفيف لـ A
+    assert next(plan) == ("C", True)
+    clock[0] += 1
+    # A: المتبقي 9 < 10
+    assert next(plan) == ("A", True)
+
+def test_unknown_costs_use_median_or_defaults(clock):
+    rows = [dict(r, full_seconds=None, lite_seconds=None) for r in PRIORITIES]
+    sched = scheduler(100, rows)
+    assert sched.cost["full"] == {s: forecast.DEFAULT_COST_S["full"] for s in "ABC"}
+    rows = [PRIORITIES[0], dict(PRIORITIES[1], full_seconds=30.0), dict(PRIORITIES[2], full_seconds=None)]
+    assert scheduler(100, rows).cost["full"]["C"] == 30.0
+
+def test_priorities_failure_keeps_alphabetical_order(clock):
+    sched = forecast.DeadlineScheduler(FakeClient(), ["C", "A", "B"], 100)
+    assert sched.order == ["A", "B", "C"]
+
+def test_save_blends_new_timings(clock):
+    sched = scheduler(100)
+    sched.record("A", False, 20.0)
+    sched.record("B", True, 2.0)
+    sched.save()
+    saved = {(r["stock_symbol"], r["mode"]): r["seconds"] for r in sched.sb.tables["forecast_symbol_costs"]}
+    alpha = forecast.COST_EWMA_ALPHA
+    assert saved == {("A", "full"): round((1 - alpha) * 10 + alpha * 20, 3),
+                     ("B", "lite"): round((1 - alpha) * 1 + alpha * 2, 3)}
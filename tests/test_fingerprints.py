@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""fingerprints: تخطّي الرموز التي لم يتغيّر سجلها، وحفظ البصمات للرموز المنجزة فقط."""
+
+import fingerprints
+from conftest import FakeClient
+
+def history_rpc(state):
+    """get_history_fingerprints من قاموس {symbol: (max_date, row_count, checksum)}."""
+    return lambda p: [{"stock_symbol": s, "max_date": state[s][0], "row_count": state[s][1],
+                       "close_checksum": state[s][2]} for s in p["p_symbols"] if s in state]
+
+def test_first_run_processes_everything_then_skips_unchanged():
+    state = {"A": ("2025-01-02", 100, "x"), "B": ("2025-01-02", 90, "y")}
+    sb = FakeClient({"get_history_fingerprints": history_rpc(state)})
+    todo, current = fingerprints.filter_changed(sb, "forecast", ["A", "B"], "v1")
+    assert todo == ["A", "B"]
+    fingerprints.save(sb, "forecast", current, todo)
+
+    state["B"] = ("2025-01-03", 91, "z")
+    assert fingerprints.filter_changed(sb, "forecast", ["A", "B"], "v1")[0] == ["B"]
+    # تغيّر الإعداد (extra) يعيد كل الرموز
+    assert fingerprints.filter_changed(sb, "forecast", ["A", "B"], "v2")[0] == ["A", "B"]
+
+def test_only_done_symbols_are_saved():
+    state = {"A": ("2025-01-02", 100, "x"), "B": ("2025-01-02", 90, "y")}
+    sb = FakeClient({"get_history_fingerprints": history_rpc(state)})
+    todo, current = fingerprints.filter_changed(sb, "indicators", ["A", "B"])
+    fingerprints.save(sb, "indicators", current, ["A"])
+    assert fingerprints.filter_changed(sb, "indicators", ["A", "B"])[0] == ["B"]
+
+def test_stages_are_independent():
+    state = {"A": ("2025-01-02", 100, "x")}
+    sb = FakeClient({"get_history_fingerprints": history_rpc(state)})
+    _, current = fingerprints.filter_changed(sb, "indicators", ["A"])
+    fingerprints.save(sb, "indicators", current, ["A"])
+    assert fingerprints.filter_changed(sb, "forecast", ["A"])[0] == ["A"]
+
+def test_missing_migration_treats_all_as_changed():
+    todo, current = fingerprints.filter_changed(FakeClient(), "forecast", ["A", "B"])
+    assert todo == ["A", "B"] and current == {}
+
+def test_config_digest_ignores_key_order():
+    assert fingerprints.config_digest({"a": 1, "b": 2}) == fingerprints.config_digest({"b": 2, "a": 1})
+    assert fingerprints.config_digest({"a": 1}) != fingerprints.config_digest({"a": 2})
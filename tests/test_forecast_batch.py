@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""ForecastBatch: بروتوكول الدُفعة، وتسجيل الرموز التي فشلت كتابتها."""
+
+import forecast_generate_tracked_symbols_v6i_1day_silent as forecast
+from conftest import FakeClient
+
+def row(sym, date="2025-01-03"):
+    return {"stock_symbol": sym, "forecast_date": date, "predicted_price": 10.0, "model_version": "v"}
+
+def batch_client():
+    calls = []
+    sb = FakeClient({"begin_forecast_batch": lambda p: calls.append(("begin", p["p_forecast_dates"])),
+                     "complete_forecast_batch": lambda p: calls.append(("complete", p["p_forecast_dates"])) or 2})
+    return sb, calls
+
+def test_batch_brackets_writes_and_evaluates_once():
+    sb, calls = batch_client()
+    batch = forecast.ForecastBatch(sb, chunk=2)
+    batch.add([row("A"), row("B")])
+    batch.add([row("C", "2025-01-06")])
+    assert batch.complete() == 2
+    assert calls == [("begin", ["2025-01-03"]), ("begin", ["2025-01-06"]),
+                     ("complete", ["2025-01-03", "2025-01-06"])]
+    assert len(sb.tables["forecasts"]) == 3 and not batch.failed
+
+def test_failed_write_is_recorded_per_symbol():
+    sb, _ = batch_client()
+    batch = forecast.ForecastBatch(sb, chunk=2)
+    batch.add([row("A")])
+    sb.failing.add("forecasts")
+    batch.add([row("B")])
+    sb.failing.discard("forecasts")
+    batch.add([row("C")])
+    batch.complete()
+    assert batch.failed == {"A", "B"}
+    assert [r["stock_symbol"] for r in sb.tables["forecasts"]] == ["C"]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""كشف الأحداث المؤسسية في sync_historical_90d، وقراءة سجل أطول من حد PostgREST."""
+
+from datetime import date, timedelta
+
+import compute_indicators_and_candles_v2 as indicators
+import forecast_generate_tracked_symbols_v6i_1day_silent as forecast
+import sync_historical_90d as history
+from conftest import FakeClient
+
+def rows(closes, start="2025-01-02"):
+    d0 = date.fromisoformat(start)
+    return [{"date": (d0 + timedelta(days=i)).isoformat(), "close": c} for i, c in enumerate(closes)]
+
+def stored(closes, start="2025-01-02"):
+    return {r["date"]: r["close"] for r in rows(closes, start)}
+
+def test_unchanged_overlap_is_not_a_corporate_action():
+    assert history.detect_corporate_action(rows([10, 11, 12, 13]), stored([10, 11, 12.01]), []) is None
+
+def test_new_split_triggers_rebuild():
+    reason = history.detect_corporate_action(rows([10, 11, 6]), stored([10, 11]), ["2025-01-04"])
+    assert reason == "split 2025-01-04"
+
+def test_split_already_stored_is_ignored():
+    assert history.detect_corporate_action(rows([5, 5.5, 6]), stored([5, 5.5, 6]), ["2024-06-03"]) is None
+
+def test_rewritten_overlap_triggers_rebuild():
+    reason = history.detect_corporate_action(rows([9, 9.9, 10.8, 11.7]), stored([10, 11, 12, 13]), [])
+    assert reason.startswith("overlap close changed")
+
+def test_too_few_overlapping_days_do_not_trigger():
+    assert history.detect_corporate_action(rows([9, 9.9]), stored([10, 11]), []) is None
+
+def long_history(n=2500):
+    d0 = date(2015, 1, 1)
+    return [{"stock_symbol": "A", "date": (d0 + timedelta(days=i)).isoformat(), "open": 1.0,
+             "high": 2.0, "low": 0.5, "close": float(i), "volume": 100} for i in range(n)]
+
+def test_fetch_history_reads_all_pages(monkeypatch):
+    sb = FakeClient()
+    sb.tables["historical_data"] = long_history()
+    monkeypatch.setattr(indicators, "INDICATORS_FULL_HISTORY", False)
+    monkeypatch.setattr(indicators, "get_client", lambda: sb)
+    hist = indicators.fetch_history("A")
+    assert len(hist) == 2500 and hist["close"].iloc[-1] == 2499.0
+
+def test_forecast_reads_latest_bars(monkeypatch):
+    sb = FakeClient()
+    sb.tables["historical_data"] = long_history()
+    monkeypatch.setattr(forecast, "HIST_ROWS", 300)
+    dfh = forecast.fetch_hist(sb, "A")
+    assert len(dfh) == 300
+    assert dfh["close"].tolist() == [float(i) for i in range(2200, 2500)]
+
+def test_fetch_history_since_reads_all_pages(monkeypatch):
+    sb = FakeClient()
+    sb.tables["historical_data"] = long_history()
+    monkeypatch.setattr(indicators, "get_client", lambda: sb)
+    new = indicators.fetch_history_since("A", "2015-01-10")
+    assert len(new) == 2490 and new["date"].iloc[0] == "2015-01-11"
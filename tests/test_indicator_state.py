@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""الحالة التراكمية (indicator_state) تطابق دوال الدفعة في compute_indicators_and_candles_v2."""
+
+import json
+import math
+
+import pytest
+
+import indicator_state
+import compute_indicators_and_candles_v2 as indicators
+
+TOL = 1e-8
+
+def batch_rows(hist, defs):
+    hist = indicators.clean_history(hist)
+    tech = indicators.compute_technical_set(hist, defs)
+    return {r["date"]: {k: v for k, v in r.items() if k not in ("stock_symbol", "date")}
+            for r in indicators.indicator_rows("S", hist, tech)}
+
+def assert_rows_match(streamed, batch):
+    assert set(streamed) == set(batch)
+    for date, values in streamed.items():
+        expected = batch[date]
+        assert set(values) == set(expected), date
+        for k, v in values.items():
+            assert math.isclose(v, expected[k], rel_tol=TOL, abs_tol=TOL), (date, k, v, expected[k])
+
+def test_config_matches_batch_columns(history, technical_defs):
+    cfg = indicator_state.config_from_defs(technical_defs)
+    assert cfg["rsi"] == 14 and cfg["sma200"] == 200 and cfg["stoch"] == [14, 3]
+    assert cfg["macd"] and cfg["macd_signal"] and cfg["macd_histogram"]
+
+def test_replay_matches_batch(history, technical_defs):
+    cfg = indicator_state.config_from_defs(technical_defs)
+    _, rows = indicator_state.replay(cfg, indicators.clean_history(history))
+    assert_rows_match({d: v for d, v in rows if v}, batch_rows(history, technical_defs))
+
+@pytest.mark.parametrize("split", [1, 30, 199, 250])
+def test_streaming_after_json_round_trip_matches_batch(history, technical_defs, split):
+    """الحالة المحفوظة في indicator_state (JSON) تكمل السلسلة كما لو لم تنقطع."""
+    cfg = indicator_state.config_from_defs(technical_defs)
+    hist = indicators.clean_history(history)
+    state, rows = indicator_state.replay(cfg, hist.iloc[:split])
+    state = indicator_state.SymbolIndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+    assert state.last_date == hist["date"].iloc[split - 1]
+    streamed = {d: v for d, v in rows if v}
+    for bar in hist.iloc[split:][["date", "open", "high", "low", "close"]].to_dict("records"):
+        values = state.update(bar)
+        if values:
+            streamed[bar["date"]] = values
+    assert_rows_match(streamed, batch_rows(history, technical_defs))
+
+def test_partial_config_only_emits_configured_columns(history):
+    defs = [{"type": "technical", "name": "SMA20", "period": 10}, {"type": "technical", "name": "RSI", "period": 7}]
+    cfg = indicator_state.config_from_defs(defs)
+    _, rows = indicator_state.replay(cfg, indicators.clean_history(history))
+    columns = set().union(*(v for _, v in rows))
+    assert columns == {"sma20", "rsi", "rsi_zone", "volatility_20", "atr14"}
+    assert_rows_match({d: v for d, v in rows if v}, batch_rows(history, defs))
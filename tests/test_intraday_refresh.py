@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""intraday_refresh: --until-close ينتظر الافتتاح ولا ينتهي إلا بعد جلسة، وكل إعادة محاولة تأخذ من الميزانية."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from urllib import error
+
+import pytest
+
+import intraday_refresh as intraday
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ساعة وهمية: datetime.now و time.monotonic و asyncio.sleep تتقدّم معاً بلا انتظار فعلي."""
+    now = [datetime(2025, 6, 2, 13, 25, tzinfo=timezone.utc)]  # الإثنين 09:25 نيويورك
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now[0].astimezone(tz) if tz else now[0].replace(tzinfo=None)
+
+    async def sleep(seconds):
+        now[0] += timedelta(seconds=seconds)
+
+    monkeypatch.setattr(intraday, "datetime", FakeDatetime)
+    monkeypatch.setattr(intraday.asyncio, "sleep", sleep)
+    monkeypatch.setattr(intraday.time, "monotonic", lambda: now[0].timestamp())
+    monkeypatch.setattr(intraday, "get_client", lambda: None)
+    return now
+
+@pytest.fixture
+def cycles(clock, monkeypatch):
+    seen = []
+
+    async def cycle(self):
+        seen.append(clock[0])
+        return 0, 0
+
+    monkeypatch.setattr(intraday.Refresher, "cycle", cycle)
+    return seen
+
+def test_until_close_waits_for_the_open_and_runs_the_session(clock, cycles):
+    asyncio.run(intraday.run(until_close=True))
+    ny = [t.astimezone(intraday.NY) for t in cycles]
+    assert (ny[0].hour, ny[0].minute) == intraday.MARKET_OPEN
+    assert (ny[-1].hour, ny[-1].minute) == (15, 55)
+    assert len(cycles) == 78 and clock[0].astimezone(intraday.NY).hour == 16
+
+def test_until_close_after_the_session_exits(clock, cycles):
+    clock[0] = datetime(2025, 6, 2, 21, 0, tzinfo=timezone.utc)
+    asyncio.run(intraday.run(until_close=True))
+    assert cycles == []
+
+def test_until_close_on_a_weekend_exits(clock, cycles):
+    clock[0] = datetime(2025, 6, 7, 13, 25, tzinfo=timezone.utc)
+    asyncio.run(intraday.run(until_close=True))
+    assert cycles == []
+
+class CountingBudget:
+    def __init__(self):
+        self.taken = 0
+
+    async def acquire(self):
+        self.taken += 1
+
+def run_batch(monkeypatch, failures):
+    calls = []
+
+    def fetch_json(url, headers=None, max_retries=4, backoff=1.5):
+        calls.append(max_retries)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return {"quoteResponse": {"result": [{"symbol": "AAPL", "regularMarketPrice": 1.5}]}}
+
+    async def sleep(seconds):
+        pass
+
+    monkeypatch.setattr(intraday, "fetch_json", fetch_json)
+    monkeypatch.setattr(intraday.asyncio, "sleep", sleep)
+    budget = CountingBudget()
+
+    async def go():
+        return await intraday.fetch_batch(["AAPL"], {}, budget, asyncio.Semaphore(1))
+
+    return asyncio.run(go()), calls, budget.taken
+
+def throttled():
+    return error.HTTPError("u", 429, "Too Many Requests", None, None)
+
+def test_each_retry_takes_a_budget_token(monkeypatch):
+    rows, calls, taken = run_batch(monkeypatch, [throttled(), error.URLError("down")])
+    assert [r["symbol"] for r in rows] == ["AAPL"]
+    assert calls == [0, 0, 0] and taken == 3
+
+def test_retries_are_bounded(monkeypatch, capsys):
+    rows, calls, taken = run_batch(monkeypatch, [throttled()] * 10)
+    assert rows == [] and taken == intraday.INTRADAY_RETRIES + 1
+    assert "[WARN] quote batch failed" in capsys.readouterr().out
+
+def test_other_errors_are_not_retried(monkeypatch):
+    rows, calls, taken = run_batch(monkeypatch, [ValueError("bad json")])
+    assert rows == [] and taken == 1
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""pg_bulk.copy_upsert: دمج COPY + ON CONFLICT على قاعدة Postgres حقيقية (fixture dsn في conftest)."""
+
+import pytest
+
+import pg_bulk
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+TABLE = "pg_bulk_roundtrip_test"
+
+@pytest.fixture
+def bulk(dsn, monkeypatch):
+    """جدول مؤقت في public يُحذف بعد الاختبار؛ copy_upsert يلتزم بمعاملته فلا يصلح rollback."""
+    monkeypatch.setattr(pg_bulk, "DATABASE_URL", dsn)
+    pg_bulk.close()
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS public.{TABLE}")
+    cur.execute(f"""CREATE TABLE public.{TABLE} (
+        id serial, stock_symbol text NOT NULL, date date NOT NULL, close real, volume bigint,
+        bullish boolean, note text, state jsonb, PRIMARY KEY (stock_symbol, date))""")
+    try:
+        yield cur
+    finally:
+        pg_bulk.close()
+        cur.execute(f"DROP TABLE IF EXISTS public.{TABLE}")
+        conn.close()
+
+def stored(cur):
+    cur.execute(f"SELECT stock_symbol, date::text, close, volume, bullish, note, state FROM public.{TABLE} "
+                "ORDER BY stock_symbol, date")
+    return cur.fetchall()
+
+def test_copy_upsert_merges_on_conflict_keys(bulk):
+    first = [
+        {"stock_symbol": "A", "date": "2025-01-02", "close": 10.5, "volume": 100, "bullish": True,
+         "note": "x, \"quoted\"", "state": {"ema": [1.5, None], "n": 3}},
+        {"stock_symbol": "A", "date": "2025-01-03", "close": None, "volume": None, "bullish": None,
+         "note": None, "state": None},
+    ]
+    assert pg_bulk.copy_upsert(TABLE, first, ["stock_symbol", "date"]) == 2
+    # مفتاح مكرر داخل الدفعة: آخر نسخة تفوز؛ والصف الموجود يُحدَّث، والمفاتيح الغائبة تُكتب NULL
+    second = [
+        {"stock_symbol": "A", "date": "2025-01-03", "close": 1.0},
+        {"stock_symbol": "A", "date": "2025-01-03", "close": 11.25, "volume": 7, "bullish": False, "state": []},
+        {"stock_symbol": "B", "date": "2025-01-02", "close": 3.0, "note": ""},
+    ]
+    assert pg_bulk.copy_upsert(TABLE, second, ["stock_symbol", "date"]) == 2
+    assert stored(bulk) == [
+        ("A", "2025-01-02", 10.5, 100, True, "x, \"quoted\"", {"ema": [1.5, None], "n": 3}),
+        ("A", "2025-01-03", 11.25, 7, False, None, []),
+        ("B", "2025-01-02", 3.0, None, None, "", None),
+    ]
+
+def test_copy_upsert_do_nothing_keeps_existing_rows(bulk):
+    pg_bulk.copy_upsert(TABLE, [{"stock_symbol": "A", "date": "2025-01-02", "close": 1.0}], ["stock_symbol", "date"])
+    pg_bulk.copy_upsert(TABLE, [{"stock_symbol": "A", "date": "2025-01-02", "close": 2.0}], ["stock_symbol", "date"],
+                        update=False)
+    assert stored(bulk)[0][2] == 1.0
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""row_diff: hash ثابت لمحتوى الصف، وإرسال الصفوف الجديدة أو المتغيّرة فقط."""
+
+import pytest
+
+import row_diff
+from conftest import FakeClient
+
+def bar(date="2025-01-02", close=10.0, **extra):
+    return {"stock_symbol": "A", "date": date, "open": 9.5, "high": 10.5, "low": 9.0, "close": close,
+            "volume": 1000, **extra}
+
+def test_hash_ignores_key_columns_order_and_nulls():
+    h = row_diff.row_hash("historical_data", bar())
+    assert h == row_diff.row_hash("historical_data", dict(reversed(list(bar().items()))))
+    assert h == row_diff.row_hash("historical_data", bar(adj_close=None))
+    assert h == row_diff.row_hash("historical_data", {**bar(), "stock_symbol": "B", "date": "2025-01-03"})
+
+def test_hash_uses_real_precision():
+    # الأعمدة real: فرق تحت 7 أرقام معنوية لا يُعد تغيّراً
+    assert row_diff.row_hash("historical_data", bar(close=10.0)) == row_diff.row_hash("historical_data", bar(close=10.0000001))
+    assert row_diff.row_hash("historical_data", bar(close=10.0)) != row_diff.row_hash("historical_data", bar(close=10.001))
+
+def test_hash_keeps_double_precision_columns():
+    # volatility_20 و atr14 من نوع double precision: أي فرق يُعد تغيّراً
+    row = {"stock_symbol": "A", "date": "2025-01-02", "rsi": 50.0, "atr14": 1.23456789}
+    assert row_diff.row_hash("technical_indicators", row) != row_diff.row_hash("technical_indicators", {**row, "atr14": 1.23456781})
+    assert row_diff.row_hash("technical_indicators", row) == row_diff.row_hash("technical_indicators", {**row, "rsi": 50.0000001})
+
+def test_forecasts_keyed_by_forecast_date():
+    row = {"stock_symbol": "A", "forecast_date": "2025-01-03", "predicted_price": 10.0}
+    assert row_diff._key("forecasts", row) == ("A", "2025-01-03")
+
+@pytest.fixture
+def diff_mode(monkeypatch):
+    monkeypatch.setattr(row_diff, "DIFF_UPSERTS", True)
+    monkeypatch.setattr(row_diff, "STATS", {})
+
+def test_only_changed_rows_pass_after_mark_written(diff_mode):
+    sb = FakeClient()
+    rows = [bar("2025-01-02"), bar("2025-01-03")]
+    assert row_diff.filter_changed(sb, "historical_data", rows) == rows
+    row_diff.mark_written(sb, "historical_data", rows)
+    changed = bar("2025-01-03", close=11.0)
+    new = bar("2025-01-06")
+    assert row_diff.filter_changed(sb, "historical_data", [bar("2025-01-02"), changed, new]) == [changed, new]
+    assert row_diff.STATS["historical_data"] == [2, 1]
+
+def test_disabled_or_unavailable_sends_everything(diff_mode, monkeypatch):
+    rows = [bar()]
+    sb = FakeClient()
+    sb.failing.add("row_hashes")
+    assert row_diff.filter_changed(sb, "historical_data", rows) == rows
+    monkeypatch.setattr(row_diff, "DIFF_UPSERTS", False)
+    assert row_diff.filter_changed(FakeClient(), "historical_data", rows) == rows
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""run_pipeline: الكتابة على دفعات عند حدود المراحل."""
+
+import run_pipeline
+
+def test_write_chunks_reports_symbols_of_failed_chunks(monkeypatch):
+    monkeypatch.setattr(run_pipeline.pg_bulk, "enabled", lambda: False)
+    rows = [{"stock_symbol": s, "date": d} for s in "ABC" for d in ("2025-01-02", "2025-01-03")]
+    written = []
+    def write(part):
+        written.append(len(part))
+        return part[0]["stock_symbol"] != "B"
+    assert run_pipeline.write_chunks(write, rows, chunk=2) == {"B"}
+    assert written == [2, 2, 2]
+
+def test_write_chunks_treats_none_as_success():
+    assert run_pipeline.write_chunks(lambda part: None, [{"stock_symbol": "A"}], chunk=1) == set()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""parse_shadow_models: إعداد SHADOW_MODELS صالح يُقرأ كما هو، وغير الصالح يعطّل وضع الظل."""
+
+import json
+
+import pytest
+
+import forecast_generate_tracked_symbols_v6i_1day_silent as forecast
+
+def parse(specs):
+    return forecast.parse_shadow_models(json.dumps(specs))
+
+def test_empty_disables_shadow_mode():
+    assert forecast.parse_shadow_models("") == []
+
+def test_overrides_merge_with_production_params():
+    models = parse([{"model_version": "challenger", "gbr_trees": 300, "learning_rate": 0.1, "recency": 1}])
+    assert [m["model_version"] for m in models] == ["challenger"]
+    params = models[0]["params"]
+    assert params["gbr_trees"] == 300 and params["learning_rate"] == 0.1
+    assert params["recency"] == 1.0 and isinstance(params["recency"], float)
+    assert params["max_depth"] == forecast.BLEND_PARAMS["max_depth"]
+
+@pytest.mark.parametrize("spec", [
+    {"model_version": "c", "learning_rate": "0.1"},
+    {"model_version": "c", "gbr_trees": 2.7},
+    {"model_version": "c", "max_depth": True},
+    {"model_version": "c", "subsample": None},
+    {"model_version": "c", "unknown": 1},
+    {"gbr_trees": 100},
+    {"model_version": forecast.MODEL_VERSION},
+])
+def test_invalid_specs_disable_shadow_mode(spec, capsys):
+    assert parse([spec]) == []
+    assert "[WARN] invalid SHADOW_MODELS" in capsys.readouterr().out
+
+def test_duplicate_versions_are_rejected():
+    assert parse([{"model_version": "c"}, {"model_version": "c"}]) == []
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+compute_indicators_sql (migration_182) يطابق compute_technical_set و detect_candles على نفس السجل.
+
+يحتاج Postgres (fixture dsn في conftest)؛ وإلا يُتخطّى.
+كل شيء يجري في معاملة تُلغى في النهاية، فلا يبقى في القاعدة شيء من الاختبار.
+"""
+
+import json
+import math
+import os
+import re
+
+import pytest
+
+import compute_indicators_and_candles_v2 as indicators
+import indicator_state
+from conftest import TECHNICAL_DEFS, make_history
+
+psycopg2 = pytest.importorskip("psycopg2")
+from psycopg2.extras import execute_values
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "migration_182_add_sql_indicator_engine.sql.txt")
+TOL = 1e-5  # أعمدة technical_indicators من نوع real
+COLUMNS = ["rsi", "macd", "macd_signal", "macd_histogram", "sma20", "sma50", "sma200", "ema12", "ema26",
+           "boll_upper", "boll_middle", "boll_lower", "stochastic_k", "stochastic_d", "williams_r",
+           "volatility_20", "atr14", "macd_cross", "rsi_zone"]
+
+# الجداول التي تقرؤها وتكتبها الدالة، إن لم تكن القاعدة مهيّأة بالمخطط الكامل
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS public.stocks (symbol text PRIMARY KEY, name text NOT NULL DEFAULT '');
+CREATE TABLE IF NOT EXISTS public.historical_data (
+  stock_symbol text NOT NULL, date date NOT NULL, open real, high real, low real, close real, volume bigint,
+  UNIQUE (stock_symbol, date));
+CREATE TABLE IF NOT EXISTS public.technical_indicators (
+  stock_symbol text NOT NULL, date date NOT NULL, rsi real, macd real, macd_signal real, macd_histogram real,
+  sma20 real, sma50 real, sma200 real, ema12 real, ema26 real, boll_upper real, boll_middle real,
+  boll_lower real, stochastic_k real, stochastic_d real, williams_r real, volatility_20 double precision,
+  atr14 double precision, macd_cross smallint, rsi_zone smallint, UNIQUE (stock_symbol, date));
+CREATE TABLE IF NOT EXISTS public.candle_patterns (
+  stock_symbol text NOT NULL, date date NOT NULL, pattern_name text NOT NULL, description text,
+  bullish boolean, confidence real, UNIQUE (stock_symbol, date, pattern_name));
+CREATE TABLE IF NOT EXISTS public.row_hashes (
+  table_name text NOT NULL, stock_symbol text NOT NULL, date date NOT NULL, row_hash text,
+  PRIMARY KEY (table_name, stock_symbol, date));
+"""
+
+# رمز قصير (أقل من نافذة SMA200)، ورموز طويلة، ورمز فيه شموع مسطّحة (high = low)
+FIXTURE = {"PARITY_A": (150, 1), "PARITY_B": (600, 2), "PARITY_C": (600, 3)}
+
+@pytest.fixture
+def cur(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA)
+            # الترحيل داخل معاملة الاختبار: بلا BEGIN/COMMIT الخاصة به
+            cur.execute(re.sub(r"^(BEGIN|COMMIT);$", "", open(MIGRATION, encoding="utf-8").read(), flags=re.M))
+            yield cur
+    finally:
+        conn.rollback()
+        conn.close()
+
+def seed(cur):
+    for i, (sym, (n, s)) in enumerate(FIXTURE.items()):
+        hist = make_history(n, seed=s)
+        if i == 2:
+            flat = hist.loc[50, "close"]
+            hist.loc[50:60, ["open", "high", "low", "close"]] = flat
+        cur.execute("INSERT INTO public.stocks (symbol, name) VALUES (%s, %s) ON CONFLICT DO NOTHING", (sym, sym))
+        execute_values(cur, "INSERT INTO public.historical_data (stock_symbol, date, open, high, low, close, volume) VALUES %s",
+                       [(sym, r.date, r.open, r.high, r.low, r.close, int(r.volume)) for r in hist.itertuples()])
+
+def stored_history(cur, sym):
+    """السجل كما تعيده PostgREST: real بأقصر تمثيل عشري."""
+    cur.execute("SELECT date::text, open::text, high::text, low::text, close::text, volume FROM public.historical_data "
+                "WHERE stock_symbol = %s ORDER BY date", (sym,))
+    df = indicators.pd.DataFrame(cur.fetchall(), columns=["date", "open", "high", "low", "close", "volume"])
+    return indicators.clean_history(df)
+
+def test_sql_engine_matches_python(cur):
+    seed(cur)
+    cfg = indicator_state.config_from_defs(TECHNICAL_DEFS)
+    cur.execute("SELECT public.compute_indicators_sql(%s::jsonb, %s)", (json.dumps(cfg), list(FIXTURE)))
+    for sym in FIXTURE:
+        _, rows_t, rows_c = indicators.compute_symbol(sym, stored_history(cur, sym), TECHNICAL_DEFS)
+        cur.execute(f"SELECT date::text, {', '.join(COLUMNS)} FROM public.technical_indicators WHERE stock_symbol = %s", (sym,))
+        stored = {r[0]: dict(zip(COLUMNS, r[1:])) for r in cur.fetchall()}
+        assert sorted(stored) == sorted(r["date"] for r in rows_t), sym
+        for row in rows_t:
+            for k in COLUMNS:
+                want, got = row.get(k), stored[row["date"]][k]
+                assert (want is None) == (got is None), (sym, row["date"], k, want, got)
+                if want is not None:
+                    assert math.isclose(got, want, rel_tol=TOL, abs_tol=TOL), (sym, row["date"], k, want, got)
+        cur.execute("SELECT date::text, pattern_name, bullish, confidence FROM public.candle_patterns "
+                    "WHERE stock_symbol = %s", (sym,))
+        got_c = sorted((d, p, b, None if c is None else round(c, 3)) for d, p, b, c in cur.fetchall())
+        want_c = sorted((r["date"], r["pattern_name"], r["bullish"], r["confidence"]) for r in rows_c)
+        assert got_c == want_c, sym
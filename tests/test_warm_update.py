@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""warm_update: التحديث الدافئ يرجّح الحداثة بنفس params["recency"] الذي يستعمله fit_blend."""
+
+import numpy as np
+import pytest
+
+import forecast_generate_tracked_symbols_v6i_1day_silent as forecast
+
+def trained_state(X, y):
+    knn, gbr, *_ = forecast.fit_blend(X, y, lite=True)
+    return {"knn": knn, "gbr": gbr}
+
+@pytest.fixture
+def xy():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 4))
+    return X, X[:, 0] * 0.01 + rng.normal(scale=0.001, size=120)
+
+@pytest.mark.parametrize("params", [None, dict(forecast.BLEND_PARAMS, recency=0.5)])
+def test_warm_update_uses_recency_param(xy, params, monkeypatch):
+    X, y = xy
+    state = trained_state(X, y)
+    seen = {}
+    fit = state["gbr"].fit
+
+    def recording_fit(X, y, sample_weight=None):
+        seen["w"] = sample_weight
+        return fit(X, y, sample_weight=sample_weight)
+
+    monkeypatch.setattr(state["gbr"], "fit", recording_fit)
+    forecast.warm_update(state, X, y, params)
+    recency = (params or forecast.BLEND_PARAMS)["recency"]
+    assert np.allclose(seen["w"], np.exp(recency * np.linspace(0, 1, len(X))))